@@ -71,6 +71,8 @@ dbDefault: Save vistrails in a database by default
 debugLevel: How much information should VisTrails log
 defaultFileType: Default file type/extension for vistrails (.vt or .xml)
 detachHistoryView: Show the version tree in a separate window
+diskCache: Cache module results on disk so they survive restarts
+diskCacheSize: Disk module result cache size (MB)
 dotVistrails: User configuration directory
 enablePackagesSilently: Automatically enable packages when needed
 errorLog: Write errors to a log file
@@ -198,6 +200,15 @@ detachHistoryView: Boolean
 
     Show the version tree in a separate window.
 
+diskCache: Boolean
+
+    Cache module results on disk, keyed on their input values, so they
+    can be reused across sessions. Requires cache.
+
+diskCacheSize: Integer
+
+    The size (in MB) of the on-disk module result cache.
+
 dotVistrails: Path
 
     The location to look for VisTrails user configurations and
@@ -696,6 +707,8 @@ base_config = {
     [ConfigField('autoSave', True, bool, ConfigType.ON_OFF),
      ConfigField('dbDefault', False, bool, ConfigType.ON_OFF),
      ConfigField('cache', True, bool, ConfigType.ON_OFF),
+     ConfigField('diskCache', False, bool, ConfigType.ON_OFF),
+     ConfigField('diskCacheSize', 100, int),
      ConfigField('stopOnError', True, bool, ConfigType.ON_OFF),
      ConfigField('executionLog', True, bool, ConfigType.ON_OFF),
      ConfigField('errorLog', True, bool, ConfigType.ON_OFF),
@@ -51,21 +51,55 @@ from vistrails.core import debug
 
 from abc import ABCMeta
 from ast import literal_eval
-from itertools import izip
+try:
+    from itertools import izip
+except ImportError:
+    # Python 3: zip is already an iterator
+    izip = zip
+import copy
+import json
+import math
 import mimetypes
+import operator
 import os
-import pickle
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 import re
 import shutil
+import stat
+import string
+import struct
 import zipfile
 import urllib
 
+# hashlib is always available on the Pythons we support; the old 'sha'
+# module fallback predates Python 2.5
+import hashlib
+sha_hash = hashlib.sha1
+
 try:
-    import hashlib
-    sha_hash = hashlib.sha1
+    import numpy
 except ImportError:
-    import sha
-    sha_hash = sha.new
+    numpy = None
+
+# os.scandir (Python 3.5+) avoids the extra stat() calls of listdir-based
+# walks; on Python 2 it is available through the 'scandir' backport
+try:
+    scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# concurrent.futures is stdlib on Python 3 and a backport ('futures')
+# on Python 2
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 
 ###############################################################################
 
@@ -232,6 +266,11 @@ def new_constant(name, py_conversion=None, default_value=None, validation=None,
     m._output_ports = [('value', m)]
     return m
 
+# The common spellings get resolved with a single dict lookup; only
+# unusual capitalizations fall through to the upper() slow path
+_bool_from_string = {'true': True, 'True': True, 'TRUE': True,
+                     'false': False, 'False': False, 'FALSE': False}
+
 class Boolean(Constant):
     _settings = ModuleSettings(
             constant_widget='%s:BooleanWidget' % constant_config_path)
@@ -239,6 +278,10 @@ class Boolean(Constant):
 
     @staticmethod
     def translate_to_python(x):
+        try:
+            return _bool_from_string[x]
+        except (KeyError, TypeError):
+            pass
         s = x.upper()
         if s == 'TRUE':
             return True
@@ -249,7 +292,17 @@ class Boolean(Constant):
 
     @staticmethod
     def validate(x):
-        return isinstance(x, bool)
+        # bools are singletons: identity checks beat the isinstance call
+        return x is True or x is False
+
+# Query methods dispatch through module-level tables: one dict lookup
+# plus a C-level operator call instead of a chain of string comparisons
+_numeric_ops = {None: operator.eq,
+                '==': operator.eq,
+                '<': operator.lt,
+                '>': operator.gt,
+                '<=': operator.le,
+                '>=': operator.ge}
 
 class Float(Constant):
     _settings = ModuleSettings(constant_widgets=[
@@ -263,22 +316,17 @@ class Float(Constant):
 
     @staticmethod
     def validate(x):
-        return isinstance(x, (int, long, float))
+        # Exact-type checks catch the common case without the MRO walk
+        t = type(x)
+        return (t is float or t is int or t is long or
+                isinstance(x, (int, long, float)))
 
     @staticmethod
     def query_compute(value_a, value_b, query_method):
-        value_a = float(value_a)
-        value_b = float(value_b)
-        if query_method == '==' or query_method is None:
-            return (value_a == value_b)
-        elif query_method == '<':
-            return (value_a < value_b)
-        elif query_method == '>':
-            return (value_a > value_b)
-        elif query_method == '<=':
-            return (value_a <= value_b)
-        elif query_method == '>=':
-            return (value_a >= value_b)
+        op = _numeric_ops.get(query_method)
+        if op is None:
+            return None
+        return op(float(value_a), float(value_b))
 
 class Integer(Float):
     _settings = ModuleSettings(constant_widgets=[
@@ -295,7 +343,8 @@ class Integer(Float):
 
     @staticmethod
     def validate(x):
-        return isinstance(x, (int, long))
+        t = type(x)
+        return t is int or t is long or isinstance(x, (int, long))
 
 class String(Constant):
     _settings = ModuleSettings(
@@ -314,22 +363,45 @@ class String(Constant):
 
     @staticmethod
     def validate(x):
-        return isinstance(x, str)
+        return type(x) is str or isinstance(x, str)
 
     @staticmethod
     def query_compute(value_a, value_b, query_method):
-        if query_method == '*[]*' or query_method is None:
-            return (value_b in value_a)
-        elif query_method == '==':
-            return (value_a == value_b)
-        elif query_method == '=~':
-            try:
-                m = re.match(value_b, value_a)
-                if m is not None:
-                    return (m.end() ==len(value_a))
-            except re.error:
-                pass
-        return False
+        op = _string_ops.get(query_method)
+        if op is None:
+            return False
+        return op(value_a, value_b)
+
+def _string_contains(value_a, value_b):
+    return value_b in value_a
+
+# Queries typically scan many values against one pattern; compiling it
+# once per distinct pattern amortizes the parse over the whole scan
+_regex_cache = {}
+
+def _compile_re(pat):
+    try:
+        return _regex_cache[pat]
+    except KeyError:
+        regex = re.compile(pat)
+        if len(_regex_cache) >= 512:
+            _regex_cache.clear()
+        _regex_cache[pat] = regex
+        return regex
+
+def _string_regex_match(value_a, value_b):
+    try:
+        m = _compile_re(value_b).match(value_a)
+        if m is not None:
+            return (m.end() == len(value_a))
+    except re.error:
+        pass
+    return False
+
+_string_ops = {None: _string_contains,
+               '*[]*': _string_contains,
+               '==': operator.eq,
+               '=~': _string_regex_match}
 
 ##############################################################################
 
@@ -399,24 +471,29 @@ class Path(Constant):
 Path.default_value = PathObject('')
 
 def path_parameter_hasher(p):
-    def get_mtime(path):
-        t = int(os.path.getmtime(path))
-        if os.path.isdir(path):
-            for subpath in os.listdir(path):
-                subpath = os.path.join(path, subpath)
-                if os.path.isdir(subpath):
-                    t = max(t, get_mtime(subpath))
-        return t
+    def hash_mtimes(path, hasher):
+        # Fold the mtimes into the hasher as we walk instead of
+        # accumulating them: no recursion frames and no intermediate
+        # lists; struct.pack gives a fixed 8 bytes per entry
+        pack = struct.pack
+        # A single stat() gives us both the mtime and the directory check
+        st = os.stat(path)
+        hasher.update(pack('<q', int(st.st_mtime)))
+        if stat.S_ISDIR(st.st_mode):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for name in dirnames:
+                    subpath = os.path.join(dirpath, name)
+                    hasher.update(pack('<q',
+                                       int(os.path.getmtime(subpath))))
 
     h = vistrails.core.cache.hasher.Hasher.parameter_signature(p)
+    hasher = sha_hash()
+    hasher.update(h)
     try:
         # FIXME: This will break with aliases - I don't really care that much
-        t = get_mtime(p.strValue)
+        hash_mtimes(p.strValue, hasher)
     except OSError:
         return h
-    hasher = sha_hash()
-    hasher.update(h)
-    hasher.update(str(t))
     return hasher.digest()
 
 class File(Path):
@@ -435,7 +512,12 @@ class File(Path):
         n = self.get_name()
         if (self.has_input("create_file") and self.get_input("create_file")):
             vistrails.core.system.touch(n)
-        if not os.path.isfile(n):
+        # A single stat() covers both the existence and regular-file checks
+        try:
+            st = os.stat(n)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
             raise ModuleError(self, 'File %r does not exist' % n)
         self.set_results(n)
         self.set_output("local_filename", n)
@@ -462,11 +544,11 @@ class Directory(Path):
             raise ModuleError(self, 'Directory "%s" does not exist' % n)
         self.set_results(n)
 
-        dir_list = os.listdir(n)
-        output_list = []
-        for item in dir_list:
-            full_path = os.path.join(n, item)
-            output_list.append(PathObject(full_path))
+        if scandir is not None:
+            output_list = [PathObject(entry.path) for entry in scandir(n)]
+        else:
+            output_list = [PathObject(os.path.join(n, item))
+                           for item in os.listdir(n)]
         self.set_output('itemList', output_list)
 
 ##############################################################################
@@ -555,6 +637,45 @@ class FileSink(NotCacheable, Module):
                         # I will just print a warning for now (Emanuele)
                         debug.warning("%s" % msg, e)
 
+def _copy_directory(src, dst):
+    """Copies a directory tree, copying the files in parallel.
+
+    shutil.copytree moves one file at a time through Python; since the
+    GIL is released during file I/O, a small thread pool keeps the disk
+    busy on directories with many files. Falls back to copytree when
+    concurrent.futures is not available.
+    """
+    if ThreadPoolExecutor is None:
+        shutil.copytree(src, dst)
+        return
+    dirs = []
+    files = []
+    seen = set()
+    for dirpath, dirnames, filenames in os.walk(src, followlinks=True):
+        # shutil.copytree recurses into symlinked directories, so follow
+        # them here too, but guard against link cycles os.walk would
+        # otherwise follow forever
+        real = os.path.realpath(dirpath)
+        if real in seen:
+            dirnames[:] = []
+            continue
+        seen.add(real)
+        rel = os.path.relpath(dirpath, src)
+        target = dst if rel == '.' else os.path.join(dst, rel)
+        os.makedirs(target)
+        dirs.append((dirpath, target))
+        for name in filenames:
+            files.append((os.path.join(dirpath, name),
+                          os.path.join(target, name)))
+    pool = ThreadPoolExecutor(max_workers=4)
+    try:
+        for _ in pool.map(lambda pair: shutil.copy2(*pair), files):
+            pass
+    finally:
+        pool.shutdown()
+    for dirpath, target in dirs:
+        shutil.copystat(dirpath, target)
+
 class DirectorySink(NotCacheable, Module):
     """DirectorySink takes a directory and writes it to a
     user-specified location in the file system.  The directory is
@@ -590,7 +711,7 @@ class DirectorySink(NotCacheable, Module):
                 raise ModuleError(self, msg)
             
         try:
-            shutil.copytree(input_dir.name, full_path)
+            _copy_directory(input_dir.name, full_path)
         except OSError, e:
             msg = 'Could not copy path from "%s" to "%s"' % \
                 (input_dir.name, full_path)
@@ -614,7 +735,9 @@ class WriteFile(Converter):
             contents = contents.decode('utf-8') # VisTrails uses UTF-8
                                                 # internally (I hope)
             contents = contents.encode(self.get_input('encoding'))
-        with open(result.name, 'wb') as fp:
+        # A large buffer keeps multi-MB payloads from being segmented
+        # into the default 8KiB writes
+        with open(result.name, 'wb', 1 << 20) as fp:
             fp.write(contents)
         self.set_output('out_value', result)
 
@@ -637,6 +760,161 @@ class ReadFile(Converter):
 
 ##############################################################################
 
+# SOURCE: http://www.easyrgb.com/index.php?X=MATH
+def _rgb_to_xyz(r, g, b):
+    # r,g,b \in [0,1]
+
+    if r > 0.04045:
+        r = ( ( r + 0.055 ) / 1.055 ) ** 2.4
+    else:
+        r = r / 12.92
+    if g > 0.04045:
+        g = ( ( g + 0.055 ) / 1.055 ) ** 2.4
+    else:
+        g = g / 12.92
+    if b > 0.04045:
+        b = ( ( b + 0.055 ) / 1.055 ) ** 2.4
+    else:
+        b = b / 12.92
+
+    r *= 100
+    g *= 100
+    b *= 100
+
+    # Observer. = 2 deg, Illuminant = D65
+    x = r * 0.4124 + g * 0.3576 + b * 0.1805
+    y = r * 0.2126 + g * 0.7152 + b * 0.0722
+    z = r * 0.0193 + g * 0.1192 + b * 0.9505
+    return (x,y,z)
+
+def _xyz_to_cielab(x,y,z):
+    # Observer= 2 deg, Illuminant= D65
+    ref_x, ref_y, ref_z = (95.047, 100.000, 108.883)
+    x /= ref_x
+    y /= ref_y
+    z /= ref_z
+
+    if x > 0.008856:
+        x = x ** ( 1/3.0 )
+    else:
+        x = ( 7.787 * x ) + ( 16 / 116.0 )
+    if y > 0.008856:
+        y = y ** ( 1/3.0 )
+    else:
+        y = ( 7.787 * y ) + ( 16 / 116.0 )
+    if z > 0.008856:
+        z = z ** ( 1/3.0 )
+    else:
+        z = ( 7.787 * z ) + ( 16 / 116.0 )
+
+    L = ( 116 * y ) - 16
+    a = 500 * ( x - y )
+    b = 200 * ( y - z )
+    return (L, a, b)
+
+def _rgb_to_cielab(r,g,b):
+    return _xyz_to_cielab(*_rgb_to_xyz(r,g,b))
+
+# numba, when installed, lets the batched CIE76 kernel run as compiled
+# machine code instead of numpy temporaries
+try:
+    import numba
+except ImportError:
+    numba = None
+
+if numpy is not None:
+    # Observer. = 2 deg, Illuminant = D65
+    _rgb_to_xyz_matrix = numpy.array([[0.4124, 0.3576, 0.1805],
+                                      [0.2126, 0.7152, 0.0722],
+                                      [0.0193, 0.1192, 0.9505]])
+    _xyz_ref_white = numpy.array([95.047, 100.000, 108.883])
+
+    def _rgb_to_cielab_array(rgb):
+        """Converts an (..., 3) array of RGB values in [0,1] to CIELAB.
+
+        The piecewise gamma and cube-root corrections are done with
+        numpy.where over whole arrays instead of per-channel branches.
+        """
+        rgb = numpy.where(rgb > 0.04045,
+                          ((rgb + 0.055) / 1.055) ** 2.4,
+                          rgb / 12.92)
+        xyz = 100.0 * numpy.dot(rgb, _rgb_to_xyz_matrix.T)
+        xyz /= _xyz_ref_white
+        xyz = numpy.where(xyz > 0.008856,
+                          xyz ** (1/3.0),
+                          (7.787 * xyz) + (16 / 116.0))
+        lab = numpy.empty(xyz.shape)
+        lab[..., 0] = (116 * xyz[..., 1]) - 16
+        lab[..., 1] = 500 * (xyz[..., 0] - xyz[..., 1])
+        lab[..., 2] = 200 * (xyz[..., 1] - xyz[..., 2])
+        return lab
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True)
+    def _cie76_batch(a_rgb, b_lab, out): # pragma: no cover
+        # Same conversion as _rgb_to_cielab_array, fused with the
+        # distance computation so no (N, 3) temporaries are allocated
+        for i in range(a_rgb.shape[0]):
+            x = 0.0
+            y = 0.0
+            z = 0.0
+            for c in range(3):
+                v = a_rgb[i, c]
+                if v > 0.04045:
+                    v = ((v + 0.055) / 1.055) ** 2.4
+                else:
+                    v = v / 12.92
+                v *= 100.0
+                if c == 0:
+                    x += v * 0.4124
+                    y += v * 0.2126
+                    z += v * 0.0193
+                elif c == 1:
+                    x += v * 0.3576
+                    y += v * 0.7152
+                    z += v * 0.1192
+                else:
+                    x += v * 0.1805
+                    y += v * 0.0722
+                    z += v * 0.9505
+            x /= 95.047
+            y /= 100.0
+            z /= 108.883
+            if x > 0.008856:
+                x = x ** (1 / 3.0)
+            else:
+                x = (7.787 * x) + (16 / 116.0)
+            if y > 0.008856:
+                y = y ** (1 / 3.0)
+            else:
+                y = (7.787 * y) + (16 / 116.0)
+            if z > 0.008856:
+                z = z ** (1 / 3.0)
+            else:
+                z = (7.787 * z) + (16 / 116.0)
+            d_l = ((116 * y) - 16) - b_lab[0]
+            d_a = (500 * (x - y)) - b_lab[1]
+            d_b = (200 * (y - z)) - b_lab[2]
+            out[i] = (d_l * d_l + d_a * d_a + d_b * d_b) ** 0.5
+
+class ColorObject(object):
+    """Lightweight wrapper around an RGB tuple.
+
+    A bare tuple can't be the module value because tuples are
+    special-cased by the interpreter's type checking; __slots__ keeps
+    this wrapper at a fraction of InstanceObject's per-instance cost.
+    """
+    __slots__ = ['tuple']
+
+    def __init__(self, t):
+        self.tuple = t
+
+# Parameter-exploration sweeps and queries round-trip the same color
+# strings over and over; memoize both directions of the conversion
+_color_parse_cache = {}
+_color_string_cache = {}
+_COLOR_CACHE_SIZE = 1024
+
 class Color(Constant):
     # We set the value of a color object to be an InstanceObject that
     # contains a tuple because a tuple would be interpreted as a
@@ -658,19 +936,39 @@ class Color(Constant):
     _input_ports = [IPort("value", "Color")]
     _output_ports = [OPort("value", "Color")]
 
-    default_value = InstanceObject(tuple=(1,1,1))
+    default_value = ColorObject((1,1,1))
 
     @staticmethod
     def translate_to_python(x):
-        return InstanceObject(
-            tuple=tuple([float(a) for a in x.split(',')]))
+        try:
+            t = _color_parse_cache[x]
+        except KeyError:
+            t = tuple(map(float, x.split(',')))
+            if len(_color_parse_cache) >= _COLOR_CACHE_SIZE:
+                _color_parse_cache.clear()
+            _color_parse_cache[x] = t
+        # cache only the immutable tuple; the wrapper is mutable, so
+        # every caller gets its own
+        return ColorObject(t)
 
     @staticmethod
     def translate_to_string(v):
-        return ','.join('%f' % c for c in v.tuple)
+        t = v.tuple
+        try:
+            return _color_string_cache[t]
+        except KeyError:
+            pass
+        s = ','.join('%f' % c for c in t)
+        if len(_color_string_cache) >= _COLOR_CACHE_SIZE:
+            _color_string_cache.clear()
+        _color_string_cache[t] = s
+        return s
 
     @staticmethod
     def validate(x):
+        if isinstance(x, ColorObject):
+            return True
+        # Older callers still hand us InstanceObject(tuple=...)
         return isinstance(x, InstanceObject) and hasattr(x, 'tuple')
 
     @staticmethod
@@ -679,75 +977,48 @@ class Color(Constant):
 
     @staticmethod
     def query_compute(value_a, value_b, query_method):
-        # SOURCE: http://www.easyrgb.com/index.php?X=MATH
-        def rgb_to_xyz(r, g, b):
-            # r,g,b \in [0,1]
-
-            if r > 0.04045: 
-                r = ( ( r + 0.055 ) / 1.055 ) ** 2.4
-            else:
-                r = r / 12.92
-            if g > 0.04045:
-                g = ( ( g + 0.055 ) / 1.055 ) ** 2.4
-            else:
-                g = g / 12.92
-            if b > 0.04045: 
-                b = ( ( b + 0.055 ) / 1.055 ) ** 2.4
-            else:
-                b = b / 12.92
-
-            r *= 100
-            g *= 100
-            b *= 100
-
-            # Observer. = 2 deg, Illuminant = D65
-            x = r * 0.4124 + g * 0.3576 + b * 0.1805
-            y = r * 0.2126 + g * 0.7152 + b * 0.0722
-            z = r * 0.0193 + g * 0.1192 + b * 0.9505
-            return (x,y,z)
-
-        def xyz_to_cielab(x,y,z):
-            # Observer= 2 deg, Illuminant= D65
-            ref_x, ref_y, ref_z = (95.047, 100.000, 108.883)
-            x /= ref_x
-            y /= ref_y
-            z /= ref_z
-
-            if x > 0.008856:
-                x = x ** ( 1/3.0 )
-            else:                    
-                x = ( 7.787 * x ) + ( 16 / 116.0 )
-            if y > 0.008856:
-                y = y ** ( 1/3.0 )
-            else:
-                y = ( 7.787 * y ) + ( 16 / 116.0 )
-            if z > 0.008856: 
-                z = z ** ( 1/3.0 )
-            else:
-                z = ( 7.787 * z ) + ( 16 / 116.0 )
+        value_a_rgb = [float(a) for a in value_a.split(',')]
+        value_b_rgb = [float(b) for b in value_b.split(',')]
+
+        if numpy is not None:
+            lab = _rgb_to_cielab_array(numpy.array([value_a_rgb,
+                                                    value_b_rgb]))
+            # cie76 difference
+            diff = numpy.sqrt(((lab[0] - lab[1]) ** 2).sum())
+        else:
+            l_1, a_1, b_1 = _rgb_to_cielab(*value_a_rgb)
+            l_2, a_2, b_2 = _rgb_to_cielab(*value_b_rgb)
 
-            L = ( 116 * y ) - 16
-            a = 500 * ( x - y )
-            b = 200 * ( y - z )
-            return (L, a, b)
-
-        def rgb_to_cielab(r,g,b):
-            return xyz_to_cielab(*rgb_to_xyz(r,g,b))
-        
-        value_a_rgb = (float(a) for a in value_a.split(','))
-        value_b_rgb = (float(b) for b in value_b.split(','))
-        value_a_lab = rgb_to_cielab(*value_a_rgb)
-        value_b_lab = rgb_to_cielab(*value_b_rgb)
-        
-        # cie76 difference
-        diff = sum((v_1 - v_2) ** 2 
-                   for v_1, v_2 in izip(value_a_lab, value_b_lab)) ** (0.5)
+            # cie76 difference; LAB is always a 3-tuple, so the unrolled
+            # expression avoids the generator protocol entirely
+            diff = ((l_1 - l_2) ** 2 +
+                    (a_1 - a_2) ** 2 +
+                    (b_1 - b_2) ** 2) ** (0.5)
 
         # print "CIE 76 DIFFERENCE:", diff
         if query_method is None:
             query_method = '2.3'
         return diff < float(query_method)
 
+    @staticmethod
+    def query_compute_batch(values_a, value_b, query_method):
+        """Batched version of query_compute for an (N, 3) RGB array.
+
+        Returns a boolean array; requires numpy.
+        """
+        values_a = numpy.asarray(values_a, dtype=numpy.float64)
+        value_b = numpy.asarray(value_b, dtype=numpy.float64)
+        lab_b = _rgb_to_cielab_array(value_b)
+        if numba is not None:
+            diffs = numpy.empty(values_a.shape[0])
+            _cie76_batch(values_a, lab_b, diffs)
+        else:
+            labs_a = _rgb_to_cielab_array(values_a)
+            diffs = numpy.sqrt(((labs_a - lab_b) ** 2).sum(axis=-1))
+        if query_method is None:
+            query_method = '2.3'
+        return diffs < float(query_method)
+
 ##############################################################################
 
 class StandardOutput(NotCacheable, Module):
@@ -833,8 +1104,11 @@ class Untuple(Module):
             values = tuple.values
         else:
             values = self.get_input("value")
+        # set_output does more than a dict store, so keep the call but
+        # bind it once instead of re-resolving the attribute per port
+        set_output = self.set_output
         for p, value in izip(self.output_ports_order, values):
-            self.set_output(p, value)
+            set_output(p, value)
 
 ##############################################################################
 
@@ -847,13 +1121,17 @@ class ConcatenateString(Module):
     future."""
 
     fieldCount = 4
-    _input_ports = [IPort("str%d" % i, "String")
-                    for i in xrange(1, 1 + fieldCount)]
+    # Port names are built once at class-creation time so compute() doesn't
+    # re-run the string formatting on every execution; interning them
+    # makes the port-dict lookups compare pointers instead of hashing
+    _port_names = tuple(intern("str%d" % i)
+                        for i in xrange(1, 1 + fieldCount))
+    _input_ports = [IPort(name, "String") for name in _port_names]
     _output_ports = [OPort("value", "String")]
 
     def compute(self):
-        result = "".join(self.force_get_input('str%d' % i, '')
-                         for i in xrange(1, 1 + self.fieldCount))
+        result = "".join([self.force_get_input(name, '')
+                          for name in self._port_names])
         self.set_output('value', result)
 
 ##############################################################################
@@ -877,13 +1155,31 @@ class ListType(object):
     __metaclass__ = ABCMeta
 
 ListType.register(list)
-try:
-    import numpy
-except ImportError:
-    numpy = None
-else:
+if numpy is not None:
     ListType.register(numpy.ndarray)
 
+# Concrete tuple of the registered list types: isinstance against it is
+# a plain type check, skipping ABCMeta.__instancecheck__ on every call
+_list_types = (list,) if numpy is None else (list, numpy.ndarray)
+
+# Pipeline reruns deserialize the same list/dict literals repeatedly;
+# cache the parse so hits skip the compiler entirely
+_literal_cache = {}
+
+def _parse_literal(v):
+    try:
+        x = _literal_cache[v]
+    except KeyError:
+        x = literal_eval(v)
+        if len(_literal_cache) >= 1024:
+            _literal_cache.clear()
+        _literal_cache[v] = x
+    if isinstance(x, (list, dict, set, tuple)):
+        # hand every caller its own copy; downstream modules may mutate
+        # the value, which must not corrupt the cache
+        return copy.deepcopy(x)
+    return x
+
 class List(Constant):
     _settings = ModuleSettings(configure_widget=
         "vistrails.gui.modules.list_configuration:ListConfigurationWidget")
@@ -904,19 +1200,24 @@ class List(Constant):
 
     @staticmethod
     def validate(x):
-        return isinstance(x, ListType)
+        return type(x) is list or isinstance(x, _list_types)
 
     @staticmethod
     def translate_to_python(v):
-        return literal_eval(v)
+        return _parse_literal(v)
 
     @staticmethod
     def translate_to_string(v, dims=None):
-        if dims is None:
-            if numpy is not None and isinstance(v, numpy.ndarray):
+        if numpy is not None and isinstance(v, numpy.ndarray):
+            if v.dtype.kind in 'iuf':
+                # json serializes the whole tolist() structure in C and
+                # the output is still a valid Python literal for
+                # numeric dtypes
+                return json.dumps(v.tolist())
+            if dims is None:
                 dims = v.ndim
-            else:
-                dims = 1
+        if dims is None:
+            dims = 1
         if dims == 1:
             return '[%s]' % ', '.join(repr(c)
                                       for c in v)
@@ -937,8 +1238,8 @@ class List(Constant):
             head = self.get_input('head')
             got_value = True
         if self.input_ports_order:
-            items = [self.get_input(p)
-                     for p in self.input_ports_order]
+            get_input = self.get_input
+            items = [get_input(p) for p in self.input_ports_order]
             got_value = True
         if self.has_input('tail'):
             tail = self.get_input('tail')
@@ -946,7 +1247,21 @@ class List(Constant):
 
         if not got_value:
             self.get_input('value')
-        self.set_output('value', head + middle + items + tail)
+        # Concatenating with + would allocate an intermediate list per
+        # term; build the result once, at its final size
+        parts = [p for p in (head, middle, items, tail) if len(p)]
+        if not parts:
+            out = []
+        elif len(parts) == 1:
+            out = list(parts[0])
+        else:
+            out = [None] * sum(len(p) for p in parts)
+            i = 0
+            for part in parts:
+                n = len(part)
+                out[i:i + n] = part
+                i += n
+        self.set_output('value', out)
 
 ##############################################################################
 # Dictionary
@@ -958,11 +1273,11 @@ class Dictionary(Constant):
 
     @staticmethod
     def translate_to_python(v):
-        return literal_eval(v)
+        return _parse_literal(v)
 
     @staticmethod
     def validate(x):
-        return isinstance(x, dict)
+        return type(x) is dict or isinstance(x, dict)
 
     def compute(self):
         d = {}
@@ -970,8 +1285,9 @@ class Dictionary(Constant):
             Constant.compute(self)
             d.update(self.outputPorts['value'])
         if self.has_input('addPair'):
-            pairs_list = self.get_input_list('addPair')
-            d.update(pairs_list)
+            # dict.update consumes the pair list in one C-level pass;
+            # no intermediate dict needed
+            d.update(self.get_input_list('addPair'))
         if self.has_input('addPairs'):
             d.update(self.get_input('addPairs'))
 
@@ -990,18 +1306,32 @@ class Null(Module):
 ##############################################################################
 
 class Unpickle(Module):
-    """Unpickles a string.
+    """Unpickles a string or a file.
     """
     _settings = ModuleSettings(hide_descriptor=True)
-    _input_ports = [IPort('input', 'String')]
+    _input_ports = [IPort('input', 'String'),
+                    IPort('file', 'File', optional=True)]
     _output_ports = [OPort('result', 'Variant')]
 
     def compute(self):
-        value = self.get_input('input')
-        self.set_output('result', pickle.loads(value))
+        if self.has_input('file'):
+            # Stream from disk: no bytes object holding the whole
+            # payload
+            fp = open(self.get_input('file').name, 'rb')
+            try:
+                result = pickle.load(fp)
+            finally:
+                fp.close()
+        else:
+            result = pickle.loads(self.get_input('input'))
+        self.set_output('result', result)
 
 ##############################################################################
 
+# Re-executing a PythonSource shouldn't re-tokenize and re-compile the
+# same source; cache the code objects keyed on the source string
+_code_cache = {}
+
 class CodeRunnerMixin(object):
     def __init__(self):
         self.output_ports_order = []
@@ -1025,7 +1355,10 @@ class CodeRunnerMixin(object):
             raise ModuleError(self, msg)
         def cache_this():
             self.is_cacheable = lambda *args, **kwargs: True
-        locals_ = locals()
+        # Build the execution namespace explicitly rather than
+        # snapshotting this frame with locals(): no frame-sized dict
+        # copy per run, and user code no longer sees function internals
+        locals_ = {}
         if use_input:
             for k in self.inputPorts:
                 locals_[k] = self.get_input(k)
@@ -1042,12 +1375,19 @@ class CodeRunnerMixin(object):
                         'self': self})
         if 'source' in locals_:
             del locals_['source']
-        # Python 2.6 needs code to end with newline
-        exec code_str + '\n' in locals_, locals_
+        code = _code_cache.get(code_str)
+        if code is None:
+            # Python 2.6 needs code to end with newline
+            code = compile(code_str + '\n', '<code string>', 'exec')
+            if len(_code_cache) >= 128:
+                _code_cache.clear()
+            _code_cache[code_str] = code
+        exec code in locals_, locals_
         if use_output:
             for k in self.output_ports_order:
-                if locals_.get(k) is not None:
-                    self.set_output(k, locals_[k])
+                v = locals_.get(k)
+                if v is not None:
+                    self.set_output(k, v)
 
 ##############################################################################
 
@@ -1071,7 +1411,15 @@ class PythonSource(CodeRunnerMixin, NotCacheable, Module):
     _output_pors = [OPort('self', 'Module')]
 
     def compute(self):
-        s = urllib.unquote(str(self.get_input('source')))
+        raw = self.get_input('source')
+        # The source rarely changes between reruns; skip the unquote
+        # when we already decoded this very string
+        cache = getattr(self, '_source_cache', None)
+        if cache is not None and cache[0] is raw:
+            s = cache[1]
+        else:
+            s = urllib.unquote(str(raw))
+            self._source_cache = (raw, s)
         self.run_code(s, use_input=True, use_output=True)
 
 ##############################################################################
@@ -1079,10 +1427,17 @@ class PythonSource(CodeRunnerMixin, NotCacheable, Module):
 def zip_extract_file(archive, filename_in_archive, output_filename):
     z = zipfile.ZipFile(archive)
     try:
-        fileinfo = z.getinfo(filename_in_archive) # Might raise KeyError
-        output_dirname, output_filename = os.path.split(output_filename)
-        fileinfo.filename = output_filename
-        z.extract(fileinfo, output_dirname)
+        src = z.open(filename_in_archive) # Might raise KeyError
+        try:
+            # Stream straight to the destination instead of renaming
+            # the archive member and going through extract()
+            dst = open(output_filename, 'wb')
+            try:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            finally:
+                dst.close()
+        finally:
+            src.close()
     finally:
         z.close()
 
@@ -1145,9 +1500,10 @@ class Round(Converter):
         fl = self.get_input('in_value')
         floor = self.get_input('floor')
         if floor:
-            integ = int(fl)         # just strip the decimals
+            # math.floor, unlike int(), also rounds down for negatives
+            integ = int(math.floor(fl))
         else:
-            integ = int(fl + 0.5)   # nearest
+            integ = int(math.floor(fl + 0.5))   # nearest
         self.set_output('out_value', integ)
 
 
@@ -1274,6 +1630,19 @@ class AssertEqual(Module):
 
 ##############################################################################
 
+# Format strings are usually constant across reruns: memoize the
+# placeholder scan so compute() goes straight to str.format
+_placeholders_cache = {}
+
+# The '_0', '_1', ... positional port names, grown on demand so they
+# are formatted at most once
+_positional_port_names = []
+
+def _positional_ports(nb):
+    while len(_positional_port_names) < nb:
+        _positional_port_names.append('_%d' % len(_positional_port_names))
+    return _positional_port_names[:nb]
+
 class StringFormat(Module):
     """
     Builds a string from objects using Python's str.format().
@@ -1286,43 +1655,39 @@ class StringFormat(Module):
 
     @staticmethod
     def list_placeholders(fmt):
+        try:
+            return _placeholders_cache[fmt]
+        except KeyError:
+            pass
         placeholders = set()
         nb = 0
-        i = 0
-        n = len(fmt)
-        while i < n:
-            if fmt[i] == '{':
-                i += 1
-                if fmt[i] == '{': # KeyError:
-                    i += 1
-                    continue
-                e = fmt.index('}', i) # KeyError
-                f = e
-                for c in (':', '!', '[', '.'):
-                    c = fmt.find(c, i)
-                    if c != -1:
-                        f = min(f, c)
-                if i == f:
-                    nb += 1
+        # string.Formatter walks the format string in C, replacing the
+        # old character-by-character Python scan
+        for _, field, _, _ in string.Formatter().parse(fmt):
+            if field is None:
+                continue
+            field = field.split('[', 1)[0].split('.', 1)[0]
+            if not field:
+                nb += 1
+            else:
+                try:
+                    arg = int(field)
+                except ValueError:
+                    placeholders.add(field)
                 else:
-                    arg = fmt[i:f]
-                    try:
-                        arg = int(arg)
-                    except ValueError:
-                        placeholders.add(arg)
-                    else:
-                        nb = max(nb, arg + 1)
-                i = e
-            i += 1
-        return nb, placeholders
+                    nb = max(nb, arg + 1)
+        result = (nb, placeholders)
+        if len(_placeholders_cache) >= 512:
+            _placeholders_cache.clear()
+        _placeholders_cache[fmt] = result
+        return result
 
     def compute(self):
         fmt = self.get_input('format')
         args, kwargs = StringFormat.list_placeholders(fmt)
-        f_args = [self.get_input('_%d' % n)
-                  for n in xrange(args)]
-        f_kwargs = dict((n, self.get_input(n))
-                        for n in kwargs)
+        get_input = self.get_input
+        f_args = [get_input(name) for name in _positional_ports(args)]
+        f_kwargs = dict((n, get_input(n)) for n in kwargs)
         self.set_output('value', fmt.format(*f_args, **f_kwargs))
 
 ##############################################################################
@@ -303,6 +303,13 @@ _documentation = \
       specified namespace instead of the 'namespace' attribute of the
       descriptor.
 
+   ModuleSettings.parallel_iterations: Boolean
+
+      If True, the iterations of a looped execution of the module may
+      run concurrently in a thread pool.  Only set this on modules
+      whose compute() is free of side effects and releases the GIL
+      during its heavy lifting (e.g. NumPy or I/O bound code).
+
    Port.name: String
 
       The name of the of the port
@@ -477,7 +484,8 @@ ModuleSettings = namedtuple('ModuleSettings',
                            (('is_root', False),),
                            (('ghost_package', None),),
                            (('ghost_package_version', None),),
-                           (('ghost_namespace', None),),])
+                           (('ghost_namespace', None),),
+                           (('parallel_iterations', False),),])
 
 Port = namedtuple('Port', 
                      [("name",),
@@ -40,11 +40,19 @@ from base64 import b16encode, b16decode
 import copy
 from itertools import izip, product, chain
 import json
+import os
 import time
 import traceback
 import warnings
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError: # pragma: no cover
+    ThreadPoolExecutor = None
 
-from vistrails.core.data_structures.bijectivedict import Bidict
 from vistrails.core import debug
 from vistrails.core.configuration import get_vistrails_configuration
 from vistrails.core.modules.config import ModuleSettings, IPort, OPort
@@ -77,17 +85,21 @@ class ModuleBreakpoint(Exception):
         self.errorTrace = ''
 
     def __str__(self):
-        retstr = "Encoutered breakpoint at Module %s:\n" % (self.module)
-        for k in self.module.__dict__.keys():
-            retstr += "\t%s = %s\n" % (k, self.module.__dict__[k])
+        # the module state does not change while the exception is alive, so
+        # the report is only built on the first str()
+        if getattr(self, '_str_cache', None) is None:
+            parts = ["Encoutered breakpoint at Module %s:\n" % (self.module,)]
+            for k, v in self.module.__dict__.items():
+                parts.append("\t%s = %s\n" % (k, v))
 
-        inputs = self.examine_inputs()
-        retstr += "\nModule has inputs:\n"
+            inputs = self.examine_inputs()
+            parts.append("\nModule has inputs:\n")
 
-        for i in inputs.keys():
-            retstr += "\t%s = %s\n" % (i, inputs[i])
+            for i, v in inputs.items():
+                parts.append("\t%s = %s\n" % (i, v))
 
-        return retstr
+            self._str_cache = "".join(parts)
+        return self._str_cache
 
     def examine_inputs(self):
         in_ports = self.module.__dict__["inputPorts"]
@@ -196,6 +208,148 @@ class DummyModuleLogging(object):
 
 _dummy_logging = DummyModuleLogging()
 
+# sub_module.InputPort cannot be imported at module level (circular
+# import); cache the class after the first lazy import instead of going
+# through the import machinery on every port read
+_InputPort = None
+
+def _get_InputPort():
+    global _InputPort
+    if _InputPort is None:
+        from vistrails.core.modules.sub_module import InputPort
+        _InputPort = InputPort
+    return _InputPort
+
+# same treatment for basic_modules.Generator, checked on every get_input
+_Generator = None
+
+def _get_Generator():
+    global _Generator
+    if _Generator is None:
+        from vistrails.core.modules.basic_modules import Generator
+        _Generator = Generator
+    return _Generator
+
+def _prune_persistent_cache(cache_dir, max_bytes):
+    """Drops the least recently used on-disk cache entries until the
+    directory fits in max_bytes. Best-effort: errors are ignored, another
+    process may be pruning the same directory.
+    """
+    try:
+        entries = []
+        total = 0
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            os.remove(path)
+            total -= size
+            if total <= max_bytes:
+                break
+    except OSError:
+        pass
+
+################################################################################
+# _ModuleInfo
+
+class _ModuleInfo(object):
+    """Dict-like pipeline info attached to each module.
+
+    Most modules never get anything beyond the defaults, so the defaults
+    live in a single shared class-level dict and per-instance storage is
+    only allocated for the keys the interpreter actually sets. The dict
+    interface (item access, get, has_key, copy) is kept for the callers
+    that treat moduleInfo as a plain dict, e.g. the spreadsheet.
+
+    """
+    __slots__ = ['_set']
+
+    # read-only defaults; never mutate these values in place
+    _defaults = {
+        'locator': None,
+        'controller': None,
+        'vistrailName': 'Unknown',
+        'version': -1,
+        'pipeline': None,
+        'moduleId': -1,
+        'reason': 'Pipeline Execution',
+        'actions': [],
+        }
+
+    def __init__(self):
+        self._set = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._set[key]
+        except KeyError:
+            return self._defaults[key]
+
+    def __setitem__(self, key, value):
+        self._set[key] = value
+
+    def __contains__(self, key):
+        return key in self._set or key in self._defaults
+
+    def has_key(self, key):
+        return key in self
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _as_dict(self):
+        d = dict(self._defaults)
+        d.update(self._set)
+        return d
+
+    def __copy__(self):
+        info = _ModuleInfo()
+        info._set = self._set.copy()
+        return info
+
+    def __repr__(self):
+        # the spreadsheet serializes moduleInfo with str() and evals it
+        # back as a dict
+        return repr(self._as_dict())
+
+################################################################################
+# _MethodMap
+
+class _MethodMap(object):
+    """Maps method connectors to their (order, port name) pair.
+
+    Replaces Bidict for Module.is_method: the two plain dicts let
+    set_input_port record a method with two C-level dict stores instead of
+    going through a Python __setitem__. As with Bidict, use inverse for
+    lookups only.
+
+    """
+    __slots__ = ['forward', 'inverse']
+
+    def __init__(self):
+        self.forward = {}
+        self.inverse = {}
+
+    def __contains__(self, key):
+        return key in self.forward
+
+    def __getitem__(self, key):
+        return self.forward[key]
+
+    def __len__(self):
+        return len(self.forward)
+
+    def values(self):
+        return self.forward.values()
+
 ################################################################################
 # Module
 
@@ -283,7 +437,7 @@ class Module(object):
         # If so, isMethod maps the port to the order in which it is
         # stored. This is so that modules that need to know about the
         # method order can work correctly
-        self.is_method = Bidict()
+        self.is_method = _MethodMap()
         self._latest_method_order = 0
         self.control_params = {}
         self.input_specs = {}
@@ -299,16 +453,7 @@ class Module(object):
         # for a spreadsheet cell to know where it is from. It will be
         # also used for talking back and forth between the spreadsheet
         # and the builder besides Parameter Exploration.
-        self.moduleInfo = {
-            'locator': None,
-            'controller': None,
-            'vistrailName': 'Unknown',
-            'version': -1,
-            'pipeline': None,
-            'moduleId': -1,
-            'reason': 'Pipeline Execution',
-            'actions': []
-            }
+        self.moduleInfo = _ModuleInfo()
 
         self.is_breakpoint = False
 
@@ -345,6 +490,9 @@ class Module(object):
         else:
             clone = object.__new__(self.__class__)
             clone.__dict__ = self.__dict__.copy()
+        # the update() shortcut is bound to the original instance
+        clone.__dict__.pop('update', None)
+        clone.__dict__.pop('_dispatch', None)
         clone.inputPorts = copy.copy(self.inputPorts)
         clone.outputPorts = copy.copy(self.outputPorts)
         clone.outputPorts['self'] = clone
@@ -367,8 +515,13 @@ class Module(object):
         self.inputPorts = {}
         self.outputPorts = {}
         self.logging = _dummy_logging
-        self.is_method = Bidict()
+        self.is_method = _MethodMap()
         self._latest_method_order = 0
+        # drop the per-instance update() shortcut and cached pipeline
+        # module, if set
+        self.__dict__.pop('update', None)
+        self.__dict__.pop('_dispatch', None)
+        self.__dict__.pop('_pipeline_module', None)
 
     def is_cacheable(self):
         """is_cacheable() -> bool.
@@ -387,19 +540,35 @@ class Module(object):
         if port_name in self.inputPorts:
             for connector in self.inputPorts[port_name]:
                 connector.obj.update() # Might raise
-            for connector in copy.copy(self.inputPorts[port_name]):
+            for connector in self.inputPorts[port_name][:]:
                 if connector.obj.get_output(connector.port) is InvalidOutput:
                     self.remove_input_connector(port_name, connector)
 
 
+    @property
+    def _pipeline_module(self):
+        """The vistrail module this object executes in the current pipeline,
+        or None. The pipeline does not change during an execution, so the
+        attribute chain through moduleInfo is resolved once and cached.
+        """
+        try:
+            return self.__dict__['_pipeline_module']
+        except KeyError:
+            pipeline = self.moduleInfo.get('pipeline', None)
+            if pipeline:
+                p_module = pipeline.modules[self.moduleInfo['moduleId']]
+            else:
+                p_module = None
+            self.__dict__['_pipeline_module'] = p_module
+            return p_module
+
     def useJobCache(self):
         """ useJobCache() -> Module/None
             Checks if this is a job cache
         """
-        if not self.moduleInfo.get('pipeline', None):
+        p_module = self._pipeline_module
+        if p_module is None:
             return False
-        p_modules = self.moduleInfo['pipeline'].modules
-        p_module = p_modules[self.moduleInfo['moduleId']]
         if p_module.has_control_parameter_with_name(
                                             ModuleControlParam.JOB_CACHE_KEY):
             jobCache = p_module.get_control_parameter_by_name(
@@ -453,6 +622,92 @@ class Module(object):
                 params[spec.name] = module.translate_to_string(self.get_output(spec.name))
                 jm.setCache(self.signature, params, p_module.name)
 
+    def _persistentCacheFile(self):
+        """ _persistentCacheFile() -> str or None
+            Returns the path of the on-disk cache entry for this execution,
+            keyed on a hash of the module class, its signature and the
+            pickled values on its input ports. Returns None if the disk
+            cache is disabled or the module cannot be cached safely.
+        """
+        conf = get_vistrails_configuration()
+        if not (getattr(conf, 'cache', True) and
+                getattr(conf, 'diskCache', False)):
+            return None
+        if not self.is_cacheable() or not self.signature:
+            return None
+        hasher = sha1_hash()
+        hasher.update(self.__class__.__module__)
+        hasher.update(self.__class__.__name__)
+        hasher.update(self.signature)
+        # Key on the actual input values. Structural signatures are not
+        # enough on disk: nothing invalidates entries downstream of
+        # non-cacheable modules the way clean_non_cacheable_modules does
+        # for the in-memory cache, and loop clones rerun with the same
+        # synthesized signature but new element/state values.
+        connectors = [(p, c) for p, cs in self.inputPorts.iteritems()
+                      for c in cs]
+        connectors.sort(key=lambda item: (item[0], item[1].port))
+        for port_name, connector in connectors:
+            try:
+                value = pickle.dumps(connector.get_raw(),
+                                     pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                # the value cannot be keyed reliably: do not cache
+                return None
+            hasher.update(port_name)
+            hasher.update(connector.port)
+            hasher.update(value)
+        from vistrails.core.system import current_dot_vistrails
+        cache_dir = os.path.join(current_dot_vistrails(), 'cache')
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                return None
+        return os.path.join(cache_dir, hasher.hexdigest() + '.pkl')
+
+    def checkPersistentCache(self, path):
+        """ checkPersistentCache(path: str) -> Boolean
+            Tries to load the outputs of a previous run of this module from
+            the on-disk cache. Returns True on a hit.
+        """
+        if not os.path.isfile(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                outputs = pickle.load(f)
+        except Exception:
+            # corrupted or unreadable entry: just recompute
+            return False
+        try:
+            # keep the entry fresh so pruning drops stale ones first
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.outputPorts.update(outputs)
+        return True
+
+    def addPersistentCache(self, path):
+        """ addPersistentCache(path: str) -> None
+            Stores the computed outputs to the on-disk cache, if they can be
+            pickled.
+        """
+        outputs = dict((name, value)
+                       for name, value in self.outputPorts.iteritems()
+                       if name != 'self')
+        try:
+            data = pickle.dumps(outputs, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # outputs hold unpicklable objects (open files, C wrappers, ...)
+            return
+        try:
+            with open(path, 'wb') as f:
+                f.write(data)
+        except (IOError, OSError):
+            return
+        max_mb = getattr(get_vistrails_configuration(), 'diskCacheSize', 100)
+        _prune_persistent_cache(os.path.dirname(path), max_mb * (1 << 20))
+
     def update_upstream(self):
         """ update_upstream() -> None
         Go upstream from the current module, then update its upstream
@@ -460,29 +715,42 @@ class Module(object):
         results
 
         """
-        suspended = []
+        # suspended stays None on the common path, holds the single
+        # exception when only one module suspended, and is only promoted to
+        # a list when there are several
+        suspended = None
         was_suspended = None
-        for connectorList in self.inputPorts.itervalues():
-            for connector in connectorList:
-                try:
-                    connector.obj.update()
-                except ModuleWasSuspended, e:
+        # flatten the connectors once so the common success path runs a
+        # single loop with one exception handler
+        for connector in [c for cl in self.inputPorts.itervalues()
+                          for c in cl]:
+            try:
+                connector.obj.update()
+            except (ModuleWasSuspended, ModuleSuspended), e:
+                if isinstance(e, ModuleWasSuspended):
                     was_suspended = e
-                except ModuleSuspended, e:
+                elif suspended is None:
+                    suspended = e
+                elif isinstance(suspended, list):
                     suspended.append(e)
-                # Here we keep going even if one of the module suspended, but
-                # we'll stop right after the loop
-        if len(suspended) == 1:
-            raise suspended[0]
-        elif suspended:
+                else:
+                    suspended = [suspended, e]
+            # Here we keep going even if one of the module suspended, but
+            # we'll stop right after the loop
+        if isinstance(suspended, list):
             raise ModuleSuspended(
                     self,
                     "multiple suspended upstream modules",
                     children=suspended)
+        elif suspended is not None:
+            raise suspended
         elif was_suspended is not None:
             raise was_suspended
-        for iport, connectorList in copy.copy(self.inputPorts.items()):
-            for connector in connectorList:
+        # items() already returns a fresh list, so the dict can be mutated
+        # while iterating; the connector lists are sliced since
+        # remove_input_connector removes from them
+        for iport, connectorList in self.inputPorts.items():
+            for connector in connectorList[:]:
                 if connector.obj.get_output(connector.port) is InvalidOutput:
                     self.remove_input_connector(iport, connector)
 
@@ -492,26 +760,35 @@ class Module(object):
         """
         iports = {}
         from vistrails.core.modules.basic_modules import List, Variant
+        input_specs = self.input_specs
+        if not input_specs:
+            # cannot do depth wrapping
+            self.iterated_ports = []
+            return
         for port_name, connectorList in self.inputPorts.iteritems():
+            # Resolve the destination port spec once per port instead of
+            # once per connector
+            port_spec = input_specs[port_name]
+            dest_descs = port_spec.descriptors()
+            dest_single = len(dest_descs) == 1
+            dest_is_list = dest_single and dest_descs[0].module == List
+            dest_is_variant = dest_single and dest_descs[0].module == Variant
+            base_dest_depth = port_spec.depth
+            if dest_is_list:
+                # Give List an additional depth
+                base_dest_depth += 1
             for connector in connectorList:
-
                 src_depth = connector.depth()
-                if not self.input_specs:
-                    # cannot do depth wrapping
-                    continue
-                # Give List an additional depth
-                dest_descs = self.input_specs[port_name].descriptors()
-                dest_depth = self.input_specs[port_name].depth
-                if len(dest_descs) == 1 and dest_descs[0].module == List:
-                    dest_depth += 1
+                dest_depth = base_dest_depth
                 if connector.spec:
                     src_descs = connector.spec.descriptors()
-                    if len(src_descs) == 1 and src_descs[0].module == List and \
-                       len(dest_descs) == 1 and dest_descs[0].module == Variant:
+                    src_single = len(src_descs) == 1
+                    if src_single and src_descs[0].module == List and \
+                       dest_is_variant:
                         # special case - Treat Variant as list
                         src_depth -= 1
-                    if len(src_descs) == 1 and src_descs[0].module == Variant and \
-                       len(dest_descs) == 1 and dest_descs[0].module == List:
+                    if src_single and src_descs[0].module == Variant and \
+                       dest_is_list:
                         # special case - Treat Variant as list
                         dest_depth -= 1
 
@@ -568,18 +845,101 @@ class Module(object):
             self.set_iterated_ports()
             self.set_streamed_ports()
             if self.streamed_ports:
-                self.build_stream()
+                dispatch = self.build_stream
             elif self.list_depth > 0:
-                self.compute_all()
+                dispatch = self.compute_all
             elif (self.in_pipeline and
                   not self.is_while and
                   (ModuleControlParam.WHILE_COND_KEY in self.control_params or
                    ModuleControlParam.WHILE_MAX_KEY in self.control_params)):
                 self.is_while = True
-                self.compute_while()
+                dispatch = self.compute_while
             else:
-                self.compute()
-                self.addJobCache()
+                dispatch = self._compute_and_cache
+            dispatch()
+            self.computed = True
+        except ModuleSuspended, e:
+            self.had_error, self.was_suspended = False, True
+            raise
+        except ModuleError, me:
+            if hasattr(me.module, 'interpreter'):
+                if me.errorTrace is None:
+                    me.errorTrace = traceback.format_exc()
+                raise
+            else:
+                msg = "A dynamic module raised an exception: '%s'" % me
+                raise ModuleError(self, msg, errorTrace=me.errorTrace)
+        except ModuleErrors:
+            raise
+        except KeyboardInterrupt, e:
+            raise ModuleError(self, 'Interrupted by user')
+        except ModuleBreakpoint:
+            raise
+        except Exception, e:
+            debug.unexpected_exception(e)
+            raise ModuleError(
+                self,
+                "Uncaught exception: %s" % debug.format_exception(e).rstrip(),
+                errorTrace=traceback.format_exc())
+        if self.annotate_output:
+            self.annotate_output_values()
+        self.upToDate = True
+        self.had_error = False
+        # Steady state reached: later updates of this instance take the same
+        # branch, so skip re-deriving it. Only done when the subclass did not
+        # override update(), as the shortcut would shadow the override.
+        if type(self).update.im_func is Module.update.im_func:
+            self._dispatch = dispatch
+            self.update = self._fast_update
+        self.logging.end_update(self)
+        self.logging.signalSuccess(self)
+
+    def _reset_for_iter(self):
+        """ _reset_for_iter() -> None
+        Clears the execution flags in one call before this module is re-run
+        for another loop or stream iteration.
+        """
+        self.had_error = self.was_suspended = False
+        self.upToDate = self.computed = False
+
+    def _compute_and_cache(self):
+        """Plain compute branch of update(), checking the result caches."""
+        # resolve the cache entry once; it hashes the input values
+        path = self._persistentCacheFile()
+        if path is None or not self.checkPersistentCache(path):
+            self.compute()
+            if path is not None:
+                self.addPersistentCache(path)
+        self.addJobCache()
+
+    def _fast_update(self):
+        """ _fast_update() -> None
+        Steady-state replacement for update(), installed on the instance
+        once its compute branch is known. Runs the same guards and error
+        handling, but skips re-deriving the iterated/streamed port dispatch
+        on every call.
+
+        """
+        if self.had_error:
+            raise ModuleHadError(self)
+        elif self.was_suspended:
+            raise ModuleWasSuspended(self)
+        elif self.computed:
+            return
+        self.logging.begin_update(self)
+        if not self.setJobCache():
+            self.update_upstream()
+        if self.upToDate:
+            if not self.computed:
+                self.logging.update_cached(self)
+                self.computed = True
+            return
+        self.had_error = True # Unset later in this method
+        self.logging.begin_compute(self)
+        try:
+            if self.is_breakpoint:
+                raise ModuleBreakpoint(self)
+            self._dispatch()
             self.computed = True
         except ModuleSuspended, e:
             self.had_error, self.was_suspended = False, True
@@ -628,10 +988,10 @@ class Module(object):
                 values.append((e,) for e in inputs[port_name])
                 port_names.append(port_name)
         if combine_type == "pairwise":
-            elements = [tuple(e for t in t_list for e in t)
+            elements = [tuple(chain.from_iterable(t_list))
                         for t_list in izip(*values)]
         elif combine_type == "cartesian":
-            elements = [tuple(e for t in t_list for e in t)
+            elements = [tuple(chain.from_iterable(t_list))
                         for t_list in product(*values)]
         else:
             raise ValueError('Unknown combine type "%s"' % combine_type)
@@ -647,8 +1007,7 @@ class Module(object):
            Similarly to controlflow's fold.
 
         """
-        from vistrails.core.modules.sub_module import InputPort
-        if isinstance(self, InputPort):
+        if isinstance(self, _get_InputPort()):
             return self.compute()
         if self.list_depth < 1:
             raise ModuleError(self, "List compute has wrong depth: %s" %
@@ -674,23 +1033,37 @@ class Module(object):
         elements, port_names = self.do_combine(combine_type, inputs, port_names)
         num_inputs = len(elements)
         loop = self.logging.begin_loop_execution(self, num_inputs)
+
+        if (num_inputs > 1 and not self.upToDate and
+                ThreadPoolExecutor is not None and
+                getattr(self._settings, 'parallel_iterations', False) and
+                self.is_cacheable()):
+            return self.compute_all_parallel(elements, port_names, num_inputs,
+                                             loop)
+
         ## Update everything for each value inside the list
         outputs = {}
+        # A single clone is reused across iterations: cloning for every
+        # element shallow-copies the port dicts N times for no benefit.
+        # Suspended iterations hang on to the module that ran them, so a
+        # fresh clone is only made after a suspension.
+        module = self.__copy__()
+        module.list_depth = self.list_depth - 1
         for i in xrange(num_inputs):
-            self.logging.update_progress(self, float(i)/num_inputs)
-            module = copy.copy(self)
-            module.list_depth = self.list_depth - 1
-            module.had_error = False
-            module.was_suspended = False
-
+            # throttle progress reports on long loops; they often cross the
+            # GUI thread boundary
+            if num_inputs < 100 or (i & 0x3f) == 0:
+                self.logging.update_progress(self, float(i)/num_inputs)
             if not self.upToDate: # pragma: no partial
                 ## Type checking if first iteration and last iteration level
                 if i == 0 and self.list_depth == 1:
                     self.typeChecking(module, port_names, elements)
 
-                module.upToDate = False
-                module.computed = False
+                module._reset_for_iter()
                 self.setInputValues(module, port_names, elements[i], i)
+            else:
+                module.had_error = False
+                module.was_suspended = False
 
             loop.begin_iteration(module, i)
 
@@ -701,6 +1074,10 @@ class Module(object):
                 module.logging.end_update(module, e, was_suspended=True)
                 suspended.append(e)
                 loop.end_iteration(module)
+                # the suspended exception keeps a reference to this clone;
+                # stop mutating it and continue with a fresh one
+                module = self.__copy__()
+                module.list_depth = self.list_depth - 1
                 continue
 
             loop.end_iteration(module)
@@ -714,7 +1091,73 @@ class Module(object):
                 output = module.get_output(nameOutput)
                 outputs[nameOutput].append(output)
 
-            self.logging.update_progress(self, i * 1.0 / num_inputs)
+            # reset the outputs so values cannot leak into the next iteration
+            module.outputPorts = copy.copy(self.outputPorts)
+            module.outputPorts['self'] = module
+
+        if suspended:
+            raise ModuleSuspended(
+                    self,
+                    "function module suspended in %d/%d iterations" % (
+                            len(suspended), num_inputs),
+                    children=suspended)
+        # set final outputs
+        for nameOutput in outputs:
+            self.set_output(nameOutput, outputs[nameOutput])
+        loop.end_loop_execution()
+
+    def compute_all_parallel(self, elements, port_names, num_inputs, loop):
+        """Runs the compute_all iterations concurrently in a thread pool.
+
+        Only used when the module class opted in through the
+        parallel_iterations module setting, which promises that compute()
+        is side-effect free and releases the GIL during its heavy lifting.
+
+        """
+        import multiprocessing
+        suspended = []
+        modules = []
+        for i in xrange(num_inputs):
+            module = self.__copy__()
+            module.list_depth = self.list_depth - 1
+            ## Type checking if first iteration and last iteration level
+            if i == 0 and self.list_depth == 1:
+                self.typeChecking(module, port_names, elements)
+            module._reset_for_iter()
+            self.setInputValues(module, port_names, elements[i], i)
+            modules.append(module)
+
+        def run_iteration(args):
+            i, module = args
+            loop.begin_iteration(module, i)
+            try:
+                module.update()
+            except ModuleSuspended, e:
+                e.loop_iteration = i
+                module.logging.end_update(module, e, was_suspended=True)
+                loop.end_iteration(module)
+                return e
+            loop.end_iteration(module)
+            return None
+
+        pool = ThreadPoolExecutor(multiprocessing.cpu_count())
+        try:
+            # map() keeps the iteration order and re-raises errors
+            results = list(pool.map(run_iteration, enumerate(modules)))
+        finally:
+            pool.shutdown()
+
+        outputs = {}
+        for i, module in enumerate(modules):
+            if results[i] is not None:
+                suspended.append(results[i])
+                continue
+            for nameOutput in module.outputPorts:
+                if nameOutput == 'self':
+                    continue
+                if nameOutput not in outputs:
+                    outputs[nameOutput] = []
+                outputs[nameOutput].append(module.get_output(nameOutput))
 
         if suspended:
             raise ModuleSuspended(
@@ -749,12 +1192,26 @@ class Module(object):
             # the module cannot handle generator so we accumulate the stream
             self.compute_accumulate()
 
+    def _set_stream_outputs(self, module, generator, size,
+                            accumulated=False):
+        """ _set_stream_outputs(module, generator, size, accumulated) -> None
+        Wires a Generator on every output port; the shared tail of the
+        streaming compute variants.
+        """
+        from vistrails.core.modules.basic_modules import Generator
+        for name_output in self.outputPorts:
+            self.set_output(name_output,
+                            Generator(size=size,
+                                      module=module,
+                                      generator=generator,
+                                      port=name_output,
+                                      accumulated=accumulated))
+
     def compute_streaming(self):
         """This method creates a generator object and sets the outputs as
         generators.
 
         """
-        from vistrails.core.modules.basic_modules import Generator
         type = self.control_params.get(ModuleControlParam.LOOP_KEY, 'pairwise')
         if type == 'cartesian':
             raise ModuleError(self,
@@ -767,19 +1224,20 @@ class Module(object):
         num_inputs = self.iterated_ports[0][2].size
         # the generator will read next from each iterated input port and
         # compute the module again
-        module = copy.copy(self)
+        module = self.__copy__()
         module.list_depth = self.list_depth - 1
         if num_inputs:
             milestones = [i*num_inputs//10 for i in xrange(1, 11)]
+        # iterated_ports does not change while streaming; resolve each
+        # port's iterator once instead of rebuilding a dict every tick
+        iter_dict = dict([(port, value)
+                          for port, depth, value in self.iterated_ports])
+        port_iters = [iter_dict[port] for port in ports]
         def generator(self):
             self.logging.begin_compute(module)
             i = 0
             while 1:
-                iter_dict = dict([(port, (depth, value))
-                                  for port, depth, value in
-                                  self.iterated_ports])
-
-                elements = [iter_dict[port][1].next() for port in ports]
+                elements = [it.next() for it in port_iters]
                 if None in elements:
                     for name_output in module.outputPorts:
                         module.set_output(name_output, None)
@@ -798,14 +1256,11 @@ class Module(object):
                         self.logging.update_progress(module, float(i)/num_inputs)
                 else:
                     self.logging.update_progress(module, 0.5)
-                module.had_error = False
+                module._reset_for_iter()
                 ## Type checking
                 if i == 0:
                     self.typeChecking(module, ports, [elements])
 
-                module.upToDate = False
-                module.computed = False
-
                 self.setInputValues(module, ports, elements, i)
 
                 try:
@@ -818,14 +1273,7 @@ class Module(object):
                 i += 1
                 yield True
 
-        _generator = generator(self)
-        # set streaming outputs
-        for name_output in self.outputPorts:
-            iterator = Generator(size=num_inputs,
-                                 module=module,
-                                 generator=_generator,
-                                 port=name_output)
-            self.set_output(name_output, iterator)
+        self._set_stream_outputs(module, generator(self), num_inputs)
 
     def compute_accumulate(self):
         """This method creates a generator object that converts all
@@ -833,19 +1281,19 @@ class Module(object):
         support streaming.
 
         """
-        from vistrails.core.modules.basic_modules import Generator
         suspended = []
         # max depth should be one
         ports = self.streamed_ports.keys()
         num_inputs = self.streamed_ports[ports[0]].size
         # the generator will read next from each iterated input port and
         # compute the module again
-        module = copy.copy(self)
-        module.had_error = False
-        module.upToDate = False
-        module.computed = False
+        module = self.__copy__()
+        module._reset_for_iter()
 
         inputs = dict([(port, []) for port in ports])
+        # computed once; the output ports do not change until the final
+        # compute at the end of the stream
+        none_outputs = dict.fromkeys(module.outputPorts, None)
         def generator(self):
             self.logging.begin_update(module)
             i = 0
@@ -872,29 +1320,20 @@ class Module(object):
                     self.logging.end_update(module)
                     yield None
 
-                for port, value in zip(ports, elements):
+                for port, value in izip(ports, elements):
                     inputs[port].append(value)
-                for name_output in module.outputPorts:
-                    module.set_output(name_output, None)
+                module.outputPorts.update(none_outputs)
                 i += 1
                 yield True
 
-        _generator = generator(self)
-        # set streaming outputs
-        for name_output in self.outputPorts:
-            iterator = Generator(size=num_inputs,
-                                 module=module,
-                                 generator=_generator,
-                                 port=name_output,
+        self._set_stream_outputs(module, generator(self), num_inputs,
                                  accumulated=True)
-            self.set_output(name_output, iterator)
 
     def compute_after_streaming(self):
         """This method creates a generator object that computes when the
         streaming is finished.
 
         """
-        from vistrails.core.modules.basic_modules import Generator
         suspended = []
 
         # max depth should be one
@@ -903,10 +1342,8 @@ class Module(object):
         num_inputs = self.streamed_ports[ports[0]].size
         # the generator will read next from each iterated input port and
         # compute the module again
-        module = copy.copy(self)
-        module.had_error = False
-        module.upToDate = False
-        module.computed = False
+        module = self.__copy__()
+        module._reset_for_iter()
 
         def generator(self):
             self.logging.begin_update(module)
@@ -937,15 +1374,8 @@ class Module(object):
                 i += 1
                 yield True
 
-        _generator = generator(self)
-        # set streaming outputs
-        for name_output in self.outputPorts:
-            iterator = Generator(size=num_inputs,
-                                 module=module,
-                                 generator=_generator,
-                                 port=name_output,
+        self._set_stream_outputs(module, generator(self), num_inputs,
                                  accumulated=True)
-            self.set_output(name_output, iterator)
 
     def compute_while(self):
         """This method executes the module once for each module.
@@ -992,27 +1422,42 @@ class Module(object):
                                   "(got %d and %d)" %(len(name_state_input),
                                                       len(name_state_output)))
 
-        module = copy.copy(self)
+        module = self.__copy__()
         module.had_error = False
         module.is_while = True
-        state = None
+        # written in place at the end of each iteration; the loop body only
+        # reads it on the following pass
+        state = [None] * len(name_state_output or ())
+        state_connectors = None
 
         loop = self.logging.begin_loop_execution(self, max_iterations)
         for i in xrange(max_iterations):
             if not self.upToDate:
-                module.upToDate = False
-                module.computed = False
+                module._reset_for_iter()
 
                 # Set state on input ports
                 if i > 0 and name_state_input:
-                    for value, input_port, output_port \
-                     in izip(state, name_state_input, name_state_output):
+                    if state_connectors is None:
+                        state_connectors = [None] * len(name_state_input)
+                    for idx, value in enumerate(state):
+                        connector = state_connectors[idx]
+                        if connector is not None:
+                            # reuse the constant module from the previous
+                            # iteration, just overwrite its value
+                            connector.obj.setValue(value)
+                            continue
+                        input_port = name_state_input[idx]
+                        output_port = name_state_output[idx]
                         if input_port in module.inputPorts:
                             del module.inputPorts[input_port]
-                        new_connector = ModuleConnector(
-                                create_constant(value), 'value',
-                                module.output_specs.get(output_port, None))
-                        module.set_input_port(input_port, new_connector)
+                        spec = module.output_specs.get(output_port, None)
+                        connector = ModuleConnector(
+                                create_constant(value), 'value', spec)
+                        module.set_input_port(input_port, connector)
+                        if spec is not None:
+                            # without a real spec the connector's guessed
+                            # type may not fit the next value; rebuild it
+                            state_connectors[idx] = connector
 
             loop.begin_iteration(module, i)
 
@@ -1038,7 +1483,8 @@ class Module(object):
 
             # Get state on output ports
             if name_state_output:
-                state = [module.get_output(port) for port in name_state_output]
+                for idx, port in enumerate(name_state_output):
+                    state[idx] = module.get_output(port)
 
             self.logging.update_progress(self, i * 1.0 / max_iterations)
 
@@ -1053,16 +1499,27 @@ class Module(object):
         """
         from vistrails.core.modules.basic_modules import create_constant
         for element, inputPort in izip(elementList, inputPorts):
-            ## Cleaning the previous connector...
-            if inputPort in module.inputPorts:
-                del module.inputPorts[inputPort]
-            spec = None
-            if inputPort in self.input_specs:
-                spec = self.input_specs[inputPort].__copy__()
-                spec.depth += module.list_depth
-            new_connector = ModuleConnector(create_constant(element), 'value',
-                                            spec)
-            module.set_input_port(inputPort, new_connector)
+            connectors = module.inputPorts.get(inputPort, None)
+            if (connectors is not None and len(connectors) == 1 and
+                    getattr(connectors[0], '_iter_constant', False)):
+                # reuse the constant module installed by a previous
+                # iteration, just overwrite its value
+                connectors[0].obj.setValue(element)
+            else:
+                ## Cleaning the previous connector...
+                if connectors is not None:
+                    del module.inputPorts[inputPort]
+                spec = None
+                if inputPort in self.input_specs:
+                    spec = self.input_specs[inputPort].__copy__()
+                    spec.depth += module.list_depth
+                new_connector = ModuleConnector(create_constant(element),
+                                                'value', spec)
+                if spec is not None:
+                    # without a real spec the connector's guessed type may
+                    # not fit the next element; rebuild it every iteration
+                    new_connector._iter_constant = True
+                module.set_input_port(inputPort, new_connector)
             # Affix a fake signature on the module
             # Ultimately, we might want to give it the signature it would have
             # with its current functions if it had a connection to the upstream
@@ -1111,17 +1568,26 @@ class Module(object):
         from vistrails.core.modules.basic_modules import get_module
         if not module.input_specs:
             return
+        # the specs and type-check flags only depend on the ports, not on
+        # the elements, so resolve them once instead of per element
+        port_specs = [module.input_specs[p] for p in inputPorts]
+        # typecheck only if all params should be type-checked
+        do_checks = [False not in self.get_type_checks(port_spec)
+                     for port_spec in port_specs]
+        if True not in do_checks:
+            # no port wants runtime checks, so the element walk would only
+            # re-discover that for every element list
+            return
         for elementList in inputList:
             if len(elementList) != len(inputPorts):
                 raise ModuleError(self,
                                   'The number of input values and input ports '
                                   'are not the same.')
-            for element, inputPort in izip(elementList, inputPorts):
+            for element, inputPort, port_spec, do_check in izip(
+                    elementList, inputPorts, port_specs, do_checks):
                 if isinstance(element, Generator):
                     raise ModuleError(self, "Generator is not allowed here")
-                port_spec = module.input_specs[inputPort]
-                # typecheck only if all params should be type-checked
-                if False in self.get_type_checks(port_spec):
+                if not do_check:
                     break
                 v_module = get_module(element, port_spec.signature)
                 if v_module is not None:
@@ -1138,13 +1604,11 @@ class Module(object):
         """
     `   Function used to create a signature, given v_module, for a port spec.
         """
-        if isinstance(v_module, tuple):
-            v_module_class = []
-            for module_ in v_module:
-                v_module_class.append(self.createSignature(module_))
-            return v_module_class
-        else:
+        if not isinstance(v_module, tuple):
+            # the scalar path is the identity, so the common case needs
+            # no call at all
             return v_module
+        return [self.createSignature(module_) for module_ in v_module]
 
     def compare(self, port_spec, v_module, port):
         """
@@ -1156,7 +1620,8 @@ class Module(object):
         from vistrails.core.vistrail.port_spec import PortSpec
         reg = get_module_registry()
 
-        v_module = self.createSignature(v_module)
+        if isinstance(v_module, tuple):
+            v_module = self.createSignature(v_module)
         port_spec2 = PortSpec(**{'signature': v_module})
         matched = reg.are_specs_matched(port_spec2, port_spec1)
 
@@ -1180,7 +1645,8 @@ class Module(object):
         :raises: ``ModuleError`` if there is no value on the port (and no default value if allow_default is True)
 
         """
-        if port_name not in self.inputPorts:
+        connectors = self.inputPorts.get(port_name, None)
+        if connectors is None:
             if allow_default and self.registry:
                 defaultValue = self.get_default_value(port_name)
                 if defaultValue is not None:
@@ -1188,18 +1654,22 @@ class Module(object):
             raise ModuleError(self, "Missing value from port %s" % port_name)
 
         # Check for generator
-        from vistrails.core.modules.basic_modules import Generator
-        raw = self.inputPorts[port_name][0].get_raw()
-        if isinstance(raw, Generator):
+        raw = connectors[0].get_raw()
+        if isinstance(raw, _get_Generator()):
             return raw
 
         if self.input_specs:
             # join connections for depth > 0 and List
-            list_desc = self.registry.get_descriptor_by_name(
-                    'org.vistrails.vistrails.basic', 'List')
-
-            if (self.input_specs[port_name].depth + self.list_depth > 0) or \
-                self.input_specs[port_name].descriptors() == [list_desc]:
+            port_spec = self.input_specs[port_name]
+            if port_spec.depth + self.list_depth > 0:
+                join = True
+            else:
+                # only pay for the descriptor lookup when the depth alone
+                # does not decide
+                list_desc = self.registry.get_descriptor_by_name(
+                        'org.vistrails.vistrails.basic', 'List')
+                join = port_spec.descriptors() == [list_desc]
+            if join:
                 ret = self.get_input_list(port_name)
                 if len(ret) > 1:
                     ret = list(chain.from_iterable(ret))
@@ -1208,7 +1678,7 @@ class Module(object):
                 return ret
 
         # else return first connector item
-        value = self.inputPorts[port_name][0]()
+        value = connectors[0]()
         return value
 
     def get_input_list(self, port_name):
@@ -1223,38 +1693,47 @@ class Module(object):
         """
         from vistrails.core.modules.basic_modules import List, Variant
 
-        if port_name not in self.inputPorts:
+        port_connectors = self.inputPorts.get(port_name, None)
+        if port_connectors is None:
             raise ModuleError(self, "Missing value from port %s" % port_name)
-        # Cannot resolve circular reference here, need to be fixed later
-        from vistrails.core.modules.sub_module import InputPort
+        InputPort = _get_InputPort()
         connectors = []
-        for connector in self.inputPorts[port_name]:
+        for connector in port_connectors:
             if isinstance(connector.obj, InputPort):
                 # add external connectors
                 connectors.extend(connector.obj.inputPorts['ExternalPipe'])
             else:
                 connectors.append(connector)
         ports = []
+        input_specs = self.input_specs
+        if input_specs:
+            # resolve the destination port spec once, not per connector
+            port_spec = input_specs[port_name]
+            dest_descs = port_spec.descriptors()
+            dest_single = len(dest_descs) == 1
+            dest_is_list = dest_single and dest_descs[0].module == List
+            dest_is_variant = dest_single and dest_descs[0].module == Variant
+            base_dest_depth = port_spec.depth + self.list_depth
+            if dest_is_list:
+                # Give List an additional depth
+                base_dest_depth += 1
         for connector in connectors:
             value = connector()
             src_depth = connector.depth()
-            if not self.input_specs:
+            if not input_specs:
                 # cannot do depth wrapping
                 ports.append(value)
                 continue
-            # Give List an additional depth
-            dest_descs = self.input_specs[port_name].descriptors()
-            dest_depth = self.input_specs[port_name].depth + self.list_depth
-            if len(dest_descs) == 1 and dest_descs[0].module == List:
-                dest_depth += 1
+            dest_depth = base_dest_depth
             if connector.spec:
                 src_descs = connector.spec.descriptors()
-                if len(src_descs) == 1 and src_descs[0].module == List and \
-                   len(dest_descs) == 1 and dest_descs[0].module == Variant:
+                src_single = len(src_descs) == 1
+                if src_single and src_descs[0].module == List and \
+                   dest_is_variant:
                     # special case - Treat Variant as list
                     src_depth -= 1
-                if len(src_descs) == 1 and src_descs[0].module == Variant and \
-                   len(dest_descs) == 1 and dest_descs[0].module == List:
+                if src_single and src_descs[0].module == Variant and \
+                   dest_is_list:
                     # special case - Treat Variant as list
                     dest_depth -= 1
             # wrap depths that are too shallow
@@ -1340,22 +1819,41 @@ class Module(object):
         return self.get_input_list(port_name)
 
     def annotate_output_values(self):
-        output_values = []
-        for port in self.outputPorts:
-            output_values.append((port, self.outputPorts[port]))
-        self.logging.annotate(self, {'output': output_values})
+        self.logging.annotate(self, {'output': list(self.outputPorts.iteritems())})
 
     def get_output(self, port_name):
-        if port_name not in self.outputPorts:
+        try:
+            return self.outputPorts[port_name]
+        except KeyError:
             raise ModuleError(self, "output port '%s' not found" % port_name)
-        return self.outputPorts[port_name]
 
     def get_input_connector(self, port_name):
-        if port_name not in self.inputPorts:
+        connectors = self.inputPorts.get(port_name, None)
+        if connectors is None:
             raise ModuleError(self, "Missing value from port %s" % port_name)
-        return self.inputPorts[port_name][0]
+        return connectors[0]
+
+    # maps (module class, port name) to the translated default; safe for
+    # the process lifetime since reloading a package rebuilds its module
+    # classes, which ages the stale keys out naturally. Only immutable
+    # defaults go in: a cached list/dict (or other translate_to_python
+    # product) would be shared by reference across instances, and a
+    # caller mutating its input would corrupt the default for everyone.
+    _default_value_cache = {}
+    _immutable_default_types = (type(None), bool, int, long, float,
+                                complex, str, unicode)
 
     def get_default_value(self, port_name):
+        key = (type(self), port_name)
+        try:
+            return Module._default_value_cache[key]
+        except KeyError:
+            value = self._lookup_default_value(port_name)
+            if isinstance(value, Module._immutable_default_types):
+                Module._default_value_cache[key] = value
+            return value
+
+    def _lookup_default_value(self, port_name):
         reg = self.registry
 
         d = None
@@ -1411,12 +1909,11 @@ class Module(object):
         self.logging.annotate(self, d)
 
     def set_input_port(self, port_name, conn, is_method=False):
-        if port_name in self.inputPorts:
-            self.inputPorts[port_name].append(conn)
-        else:
-            self.inputPorts[port_name] = [conn]
+        self.inputPorts.setdefault(port_name, []).append(conn)
         if is_method:
-            self.is_method[conn] = (self._latest_method_order, port_name)
+            value = (self._latest_method_order, port_name)
+            self.is_method.forward[conn] = value
+            self.is_method.inverse[value] = conn
             self._latest_method_order += 1
 
     def enable_output_port(self, port_name):
@@ -1435,11 +1932,13 @@ class Module(object):
         Remove a connector from the connection list of an input port
 
         """
-        if port_name in self.inputPorts:
-            conList = self.inputPorts[port_name]
-            if connector in conList:
+        conList = self.inputPorts.get(port_name, None)
+        if conList is not None:
+            try:
                 conList.remove(connector)
-            if conList==[]:
+            except ValueError:
+                pass
+            if not conList:
                 del self.inputPorts[port_name]
 
     def create_instance_of_type(self, ident, name, ns=''):
@@ -1462,16 +1961,12 @@ class Module(object):
         """
         # use the below tag if calling from a PythonSource
         # pragma: streaming - This tag is magic, do not change.
-        from vistrails.core.modules.basic_modules import Generator
-
         ports = self.streamed_ports.keys()
         specs = []
         num_inputs = self.streamed_ports[ports[0]].size
-        module = copy.copy(self)
+        module = self.__copy__()
         module.list_depth = self.list_depth - 1
-        module.had_error = False
-        module.upToDate = False
-        module.computed = False
+        module._reset_for_iter()
 
         if num_inputs:
             milestones = [i*num_inputs//10 for i in xrange(1, 11)]
@@ -1509,15 +2004,7 @@ class Module(object):
                 i += 1
                 yield True
 
-        generator = _Generator(self)
-        # sets streaming outputs for downstream modules
-        for name_output in self.outputPorts:
-            iterator = Generator(size=num_inputs,
-                                 module=module,
-                                 generator=generator,
-                                 port=name_output)
-
-            self.set_output(name_output, iterator)
+        self._set_stream_outputs(module, _Generator(self), num_inputs)
 
     def set_streaming_output(self, port, generator, size=0):
         """This method is used to set a streaming output port.
@@ -1529,7 +2016,7 @@ class Module(object):
         :type size: int
         """
         from vistrails.core.modules.basic_modules import Generator
-        module = copy.copy(self)
+        module = self.__copy__()
 
         if size:
             milestones = [i*size//10 for i in xrange(1, 11)]
@@ -1641,6 +2128,49 @@ class Module(object):
 
 ################################################################################
 
+try:
+    import numba
+except ImportError: # pragma: no cover
+    numba = None
+
+def numba_compute(func):
+    """Opt-in decorator JIT-compiling a numeric kernel with numba.
+
+    Apply it to the pure numeric helper functions that a compute() method
+    calls in a loop, not to compute() itself: numba can only compile code
+    operating on scalars and NumPy arrays of predictable shape, and it
+    cannot see through ports or module state. Compilation is deferred to
+    the first call so that importing this module stays cheap; the
+    interpreted function is used unchanged when numba is not installed,
+    when compilation fails, or when a call raises on arguments the
+    compiled version cannot handle.
+
+    """
+    if numba is None:
+        return func
+    state = []
+    def wrapper(*args, **kwargs):
+        if not state:
+            try:
+                state.append(numba.njit(cache=True)(func))
+            except Exception:
+                state.append(func)
+        compiled = state[0]
+        try:
+            return compiled(*args, **kwargs)
+        except Exception:
+            if compiled is func:
+                raise
+            # these arguments are not nopython-compatible; give up on the
+            # compiled version for good
+            state[0] = func
+            return func(*args, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+################################################################################
+
 class NotCacheable(object):
 
     def is_cacheable(self):
@@ -1714,6 +2244,28 @@ class ModuleConnector(object):
             spec = PortSpec(**{'signature': get_module(self.get_raw())})
         self.spec = spec
         self.typecheck = typecheck
+        # spec and typecheck do not change after construction, so the
+        # validation branch of __call__ is decided here once instead of on
+        # every fetch
+        self._validate_plan = None
+        if spec is not None and typecheck is not None:
+            descs = spec.descriptors()
+            if len(descs) == 1:
+                if typecheck[0]:
+                    validate = getattr(descs[0].module, 'validate', None)
+                    if validate is not None:
+                        self._validate_plan = ('scalar', validate,
+                                               descs[0].name)
+            else:
+                flags = typecheck
+                if len(flags) == 1:
+                    flags = [flags[0]] * len(descs) if flags[0] else None
+                if flags is not None:
+                    checks = [(i, desc.module.validate, desc.name)
+                              for i, desc in enumerate(descs)
+                              if flags[i] and
+                              hasattr(desc.module, 'validate')]
+                    self._validate_plan = ('tuple', checks, len(descs))
 
     def clear(self):
         """clear() -> None. Removes references, prepares for deletion."""
@@ -1762,43 +2314,31 @@ class ModuleConnector(object):
                 # Only type-check first value
                 value = value[0] if value is not None and len(value) else None
 
-        if self.spec is not None and self.typecheck is not None:
-            descs = self.spec.descriptors()
-            typecheck = self.typecheck
-            if len(descs) == 1:
-                if not typecheck[0]:
-                    return result
-                mod = descs[0].module
-                if value is not None and hasattr(mod, 'validate') \
-                   and not mod.validate(value):
+        plan = self._validate_plan
+        if plan is not None:
+            if plan[0] == 'scalar':
+                _, validate, desc_name = plan
+                if value is not None and not validate(value):
                     raise ModuleError(self.obj, "Type passed on Variant port "
                                       "%s does not match destination type "
-                                      "%s" % (self.port, descs[0].name))
+                                      "%s" % (self.port, desc_name))
             else:
-                if len(typecheck) == 1:
-                    if typecheck[0]:
-                        typecheck = [True] * len(descs)
-                    else:
-                        return result
+                _, checks, num_descs = plan
                 if not isinstance(value, tuple):
                     raise ModuleError(self.obj, "Type passed on Variant port "
                                       "%s is not a tuple" % self.port)
-                elif len(value) != len(descs):
+                elif len(value) != num_descs:
                     raise ModuleError(self.obj, "Object passed on Variant "
                                       "port %s does not have the correct "
                                       "length (%d, expected %d)" % (
-                                      self.port, len(result), len(descs)))
-                for i, desc in enumerate(descs):
-                    if not typecheck[i]:
-                        continue
-                    mod = desc.module
-                    if hasattr(mod, 'validate'):
-                        if not mod.validate(value[i]):
-                            raise ModuleError(
-                                    self.obj,
-                                    "Element %d of tuple passed on Variant "
-                                    "port %s does not match the destination "
-                                    "type %s" % (i, self.port, desc.name))
+                                      self.port, len(result), num_descs))
+                for i, validate, desc_name in checks:
+                    if not validate(value[i]):
+                        raise ModuleError(
+                                self.obj,
+                                "Element %d of tuple passed on Variant "
+                                "port %s does not match the destination "
+                                "type %s" % (i, self.port, desc_name))
         return result
 
 
@@ -35,6 +35,7 @@
 ###############################################################################
 from __future__ import division
 
+import fcntl
 import os
 import re
 import shutil
@@ -111,10 +112,35 @@ def remove_graph_viz_temporaries():
     os.unlink(tempfile.gettempdir() + "dot_output_vistrails.txt")
     os.unlink(tempfile.gettempdir() + "dot_tmp_vistrails.txt")
 
+# FICLONE ioctl: copy-on-write clone on Btrfs/XFS, no data blocks moved
+_FICLONE = 0x40049409
+
+def _try_reflink(src, dst):
+    """_try_reflink(src:str, dst:str) -> bool
+    Tries to make dst a copy-on-write clone of src. Returns False if the
+    filesystem does not support reflinks.
+
+    """
+    try:
+        fsrc = open(src, 'rb')
+    except IOError:
+        return False
+    try:
+        fdst = open(dst, 'wb')
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return True
+        except (IOError, OSError):
+            return False
+        finally:
+            fdst.close()
+    finally:
+        fsrc.close()
+
 def link_or_copy(src, dst):
     """link_or_copy(src:str, dst:str) -> None
-    Tries to create a hard link to a file. If it is not possible, it will
-    copy file src to dst
+    Tries to create a hard link to a file, then a copy-on-write clone.
+    If neither is possible, it will copy file src to dst
 
     """
     # Links if possible, but we're across devices, we need to copy.
@@ -122,8 +148,10 @@ def link_or_copy(src, dst):
         os.link(src, dst)
     except OSError, e:
         if e.errno == 18:
-            # Across-device linking is not possible. Let's copy.
-            shutil.copyfile(src, dst)
+            # Across-device linking is not possible. Try a reflink
+            # before shoveling the bytes through a full copy.
+            if not _try_reflink(src, dst):
+                shutil.copyfile(src, dst)
         else:
             raise e
 
@@ -108,7 +108,8 @@ class UpgradeModuleRemap(object):
 
     @classmethod
     def __copy__(cls, obj):
-        newobj = cls()
+        # bypass __init__, which requires the version arguments
+        newobj = cls.__new__(cls)
         for k, v in obj.__dict__.iteritems():
             if k.startswith('_') and k.endswith('_remap'):
                 v = copy.copy(v)
@@ -42,6 +42,23 @@ from pymongo import MongoClient
 from vistrails.core.modules.vistrails_module import Module
 
 
+# Connected clients, keyed on (host, port). MongoClient spawns monitor
+# threads and warms a connection pool, so one client per server is shared
+# by every module in every workflow run
+_clients = {}
+
+
+def get_client(host, port):
+    key = (host, port)
+    client = _clients.get(key)
+    if client is None:
+        kwargs = {'host': host}
+        if port is not None:
+            kwargs['port'] = port
+        client = _clients[key] = MongoClient(**kwargs)
+    return client
+
+
 class MongoDatabase(Module):
     """Connects to MongoDB and selects a database.
     """
@@ -53,10 +70,9 @@ class MongoDatabase(Module):
     _output_ports = [('database', '(MongoDatabase)')]
 
     def compute(self):
-        kwargs = {'host': self.get_input('host')}
-        if self.has_input('port'):
-            kwargs['port'] = self.get_input('port')
-        client = MongoClient(**kwargs)
+        client = get_client(self.get_input('host'),
+                            self.get_input('port')
+                            if self.has_input('port') else None)
 
         database = client.get_database(self.get_input('database'))
 
@@ -137,15 +153,24 @@ class BaseCollectionOperation(Module):
 _modules.append((BaseCollectionOperation, {'abstract': True}))
 
 
+# operation classes already generated, keyed on the function name, so
+# running the decorators again hands back the same class objects
+_op_classes = {}
+
+
 def collection_op(input_ports, output=None, doc=None):
     def wrapper(func):
-        dct = {'_input_ports': input_ports,
-               'collection_operation': func,
-               '__doc__': doc}
-        if output:
-            dct['_output_ports'] = [output]
-            dct['collection_op_out'] = output[0]
-        _modules.append(type(func.func_name, (BaseCollectionOperation,), dct))
+        klass = _op_classes.get(func.__name__)
+        if klass is None:
+            dct = {'_input_ports': input_ports,
+                   'collection_operation': func,
+                   '__doc__': doc}
+            if output:
+                dct['_output_ports'] = [output]
+                dct['collection_op_out'] = output[0]
+            klass = type(func.__name__, (BaseCollectionOperation,), dct)
+            _op_classes[func.__name__] = klass
+        _modules.append(klass)
         return func
     return wrapper
 
@@ -156,6 +181,16 @@ def InsertOne(self, coll):
     coll.insert_one(self.get_input('document'))
 
 
+@collection_op([('documents', '(basic:List)'),
+                ('ordered', '(basic:Boolean)',
+                 {'optional': True, 'defaults': ['False']})],
+               doc="Insert a list of documents into a collection in a single "
+                   "batch.")
+def InsertMany(self, coll):
+    coll.insert_many(self.get_input('documents'),
+                     ordered=self.get_input('ordered'))
+
+
 @collection_op([('filter', '(basic:Dictionary)'),
                 ('document', '(basic:Dictionary)')],
                doc="Replace a single document matching the filter.")
@@ -185,7 +220,22 @@ def DeleteMany(self, coll):
     coll.delete_many(self.get_input('filter'))
 
 
-@collection_op([('pipeline', '(basic:List)')],
+@collection_op([('ops', '(basic:List)'),
+                ('ordered', '(basic:Boolean)',
+                 {'optional': True, 'defaults': ['False']})],
+               doc="Execute a list of write operations in a single batch.\n"
+                   "\n"
+                   "`ops` is a list of pymongo operation objects "
+                   "(``pymongo.InsertOne``, ``pymongo.UpdateOne``, "
+                   "``pymongo.DeleteOne``, ...); they are sent to the server "
+                   "in one round-trip instead of one per operation.")
+def BulkWrite(self, coll):
+    coll.bulk_write(self.get_input('ops'),
+                    ordered=self.get_input('ordered'))
+
+
+@collection_op([('pipeline', '(basic:List)'),
+                ('batch_size', '(basic:Integer)', {'optional': True})],
                output=('results', '(basic:List)'),
                doc="Calculate aggregate values for the data in the "
                    "collection.\n"
@@ -194,16 +244,26 @@ def DeleteMany(self, coll):
                    " pipeline operators <https://docs.mongodb.com/manual/ref"
                    "erence/operator/aggregation-pipeline/>`__ for details.")
 def Aggregate(self, coll):
+    batch_size = self.force_get_input('batch_size', 0)
+    if batch_size:
+        return list(coll.aggregate(self.get_input('pipeline'),
+                                   batchSize=batch_size))
     return list(coll.aggregate(self.get_input('pipeline')))
 
 
 @collection_op([('filter', '(basic:Dictionary)'),
-                ('limit', '(basic:Integer)', {'optional': True})],
+                ('limit', '(basic:Integer)', {'optional': True}),
+                ('batch_size', '(basic:Integer)', {'optional': True})],
                output=('results', '(basic:List)'),
                doc="Query the database.")
 def Find(self, coll):
-    return list(coll.find(self.get_input('filter'),
-                          limit=self.force_get_input('limit', 0)))
+    cursor = coll.find(self.get_input('filter'),
+                       limit=self.force_get_input('limit', 0))
+    batch_size = self.force_get_input('batch_size', 0)
+    if batch_size:
+        # fewer, bigger batches from the server for large result sets
+        cursor = cursor.batch_size(batch_size)
+    return list(cursor)
 
 
 @collection_op([('filter', '(basic:Dictionary)')],
@@ -245,16 +305,29 @@ def FindOneAndUpdate(self, coll):
                doc="Get the number of documents in this collection, "
                    "optionally matching a filter.")
 def Count(self, coll):
-    return coll.count(self.force_get_input('filter'))
-
-
-@collection_op([('key', '(basic:String)'), ('filter', '(basic:Dictionary)')],
+    if self.has_input('filter'):
+        if hasattr(coll, 'count_documents'):
+            return coll.count_documents(self.get_input('filter'))
+        return coll.count(self.get_input('filter'))
+    # without a filter the server can answer from collection metadata
+    # instead of scanning
+    if hasattr(coll, 'estimated_document_count'):
+        return coll.estimated_document_count()
+    return coll.count()
+
+
+@collection_op([('key', '(basic:String)'),
+                ('filter', '(basic:Dictionary)', {'optional': True})],
                output=('results', '(basic:List)'),
                doc="Get a list of distinct values for `key` among all "
                    "documents in this collection, or the ones matching the "
                    "filter.")
 def Distinct(self, coll):
-    return list(coll.distinct(self.get_input('key'), self.get_input('filter')))
+    key = self.get_input('key')
+    if self.has_input('filter'):
+        return list(coll.distinct(key, self.get_input('filter')))
+    # leave the argument out rather than encoding an empty filter
+    return list(coll.distinct(key))
 
 
 @collection_op([('key', '(basic:List)'), ('condition', '(basic:Dictionary)'),
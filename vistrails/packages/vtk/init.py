@@ -36,8 +36,8 @@
 from __future__ import division
 
 import copy
-import re
 import os.path
+import threading
 
 import vtk
 
@@ -79,6 +79,10 @@ if registry.has_module('org.vistrails.vistrails.spreadsheet', 'SpreadsheetCell')
 
 ################# OUTPUT MODULES #############################################
 
+# PyQt4, imported once on first offscreen render (Darwin only)
+_QtCore = None
+_QtGui = None
+
 def render_to_image(output_filename, vtk_format, renderer, w, h):
     window = vtk.vtkRenderWindow()
     window.OffScreenRenderingOn()
@@ -88,8 +92,10 @@ def render_to_image(output_filename, vtk_format, renderer, w, h):
     # dependency...
     widget = None
     if systemType=='Darwin':
-        from PyQt4 import QtCore, QtGui
-        widget = QtGui.QWidget(None, QtCore.Qt.FramelessWindowHint)
+        global _QtCore, _QtGui
+        if _QtGui is None:
+            from PyQt4 import QtCore as _QtCore, QtGui as _QtGui
+        widget = _QtGui.QWidget(None, _QtCore.Qt.FramelessWindowHint)
         widget.resize(w, h)
         widget.show()
         window.SetWindowInfo(str(int(widget.winId())))
@@ -114,16 +120,17 @@ def render_to_image(output_filename, vtk_format, renderer, w, h):
 class vtkRendererToFile(ImageFileMode):
     config_cls = ImageFileModeConfig
     formats = ['png', 'jpg', 'tif', 'pnm']
+    format_map = {'png': vtk.vtkPNGWriter,
+                  'jpg': vtk.vtkJPEGWriter,
+                  'tif': vtk.vtkTIFFWriter,
+                  'pnm': vtk.vtkPNMWriter}
 
     @classmethod
     def can_compute(cls):
         return True
 
     def compute_output(self, output_module, configuration):
-        format_map = {'png': vtk.vtkPNGWriter,
-                      'jpg': vtk.vtkJPEGWriter,
-                      'tif': vtk.vtkTIFFWriter,
-                      'pnm': vtk.vtkPNMWriter}
+        format_map = self.format_map
         r = output_module.get_input("value")[0].vtkInstance
         w = configuration["width"]
         h = configuration["height"]
@@ -225,33 +232,138 @@ def base_name(name):
         return name[:i]
     return name
 
+# special-case starting indices for overloaded function remaps
+_f_map = {"vtkCellArray": {"InsertNextCell": 3}}
+
+# The factories below are at module scope because build_remap runs once
+# per upgraded module name; nesting them re-created every function object
+# on each call.
+
+def create_function(module, *argv, **kwargs):
+    controller = _get_controller()
+    # create function using the current module version and identifier
+    # FIXME: This should really be handled by the upgrade code somehow
+    new_desc = registry.get_descriptor_by_name(module.package,
+                                               module.name,
+                                               module.namespace)
+    old_identifier = module.package
+    module.package = identifier
+    old_package_version = module.version
+    module.version = new_desc.package_version
+    new_function = controller.create_function(module, *argv, **kwargs)
+    module.package = old_identifier
+    module.version = old_package_version
+    return new_function
+
+def build_function(old_function, new_function_name, new_module):
+    if len(old_function.parameters) > 0:
+        new_param_vals, aliases = \
+            zip(*[(p.strValue, p.alias)
+                  for p in old_function.parameters])
+    else:
+        new_param_vals = []
+        aliases = []
+    new_function = create_function(new_module,
+                                   new_function_name,
+                                   new_param_vals,
+                                   aliases)
+    return new_function
+
+def change_func(name, value):
+    def remap(old_func, new_module):
+        new_function = create_function(new_module, name, [value])
+        return [('add', new_function, 'module', new_module.id)]
+    return remap
+
+def change_SetXint(spec):
+    # Fix old SetX methods that takes an int representing the enum
+    def remap(old_func, new_module):
+        value = int(old_func.params[0].strValue)
+        value = spec.values[0][value]
+        new_function = create_function(new_module, spec.name, [value])
+        return [('add', new_function, 'module', new_module.id)]
+    return remap
+
+def color_func(name):
+    def remap(old_func, new_module):
+        value = ','.join([p.strValue for p in old_func.params])
+        new_function = create_function(new_module, name, [value])
+        return [('add', new_function, 'module', new_module.id)]
+    return remap
+
+def file_func(name):
+    def remap(old_func, new_module):
+        value = PathObject(old_func.params[0].strValue)
+        new_function = create_function(new_module, name, [value])
+        return [('add', new_function, 'module', new_module.id)]
+    return remap
+
+def to_file_func(name):
+    # Add Path module as name->File converter
+    def remap(old_conn, new_module):
+        controller = _get_controller()
+        create_new_connection = UpgradeWorkflowHandler.create_new_connection
+        pipeline = _get_pipeline()
+        module = pipeline.modules[old_conn.source.moduleId]
+        x = (module.location.x + new_module.location.x)/2
+        y = (module.location.y + new_module.location.y)/2
+        path_module = controller.create_module(basic_pkg, 'Path',
+                                               '', x, y)
+        conn1 = create_new_connection(controller,
+                                      module,
+                                      old_conn.source,
+                                      path_module,
+                                      'name')
+        # Avoid descriptor lookup by explicitly creating Ports
+        input_port_id = controller.id_scope.getNewId(Port.vtType)
+        input_port = Port(id=input_port_id,
+                          name='value',
+                          type='source',
+                          signature=(Path,),
+                          moduleId=path_module.id,
+                          moduleName=path_module.name)
+        output_port_id = controller.id_scope.getNewId(Port.vtType)
+        output_port = Port(id=output_port_id,
+                           name=name,
+                           type='destination',
+                           signature=(Path,),
+                           moduleId=new_module.id,
+                           moduleName=new_module.name)
+        conn2 = create_new_connection(controller,
+                                      path_module,
+                                      input_port,
+                                      new_module,
+                                      output_port)
+        return [('add', path_module),
+                ('add', conn1),
+                ('add', conn2)]
+    return remap
+
 def build_remap(module_name=None):
     global _remap, _controller
 
     reg = get_module_registry()
-    uscore_num = re.compile(r"(.+)_(\d+)$")
 
-    def create_function(module, *argv, **kwargs):
-        controller = _get_controller()
-        # create function using the current module version and identifier
-        # FIXME: This should really be handled by the upgrade code somehow
-        new_desc = reg.get_descriptor_by_name(module.package,
-                                              module.name,
-                                              module.namespace)
-        old_identifier = module.package
-        module.package = identifier
-        old_package_version = module.version
-        module.version = new_desc.package_version
-        new_function = controller.create_function(module, *argv, **kwargs)
-        module.package = old_identifier
-        module.version = old_package_version
-        return new_function
+    # the hierarchy walk and dict merges are repeated several times per
+    # module while remaps are built; memoized for this build_remap pass
+    # (and the remap closures that outlive it)
+    port_specs_cache = {}
 
     def get_port_specs(descriptor, port_type):
-        ports = {}
-        for desc in reversed(reg.get_module_hierarchy(descriptor)):
-            ports.update(reg.module_ports(port_type, desc))
-        return ports
+        try:
+            return port_specs_cache[(descriptor, port_type)]
+        except KeyError:
+            # flatten on top of the parent's already-flattened dict, so
+            # each ancestor level is merged once per package, not once
+            # per leaf class
+            hierarchy = reg.get_module_hierarchy(descriptor)
+            if len(hierarchy) > 1:
+                ports = get_port_specs(hierarchy[1], port_type).copy()
+            else:
+                ports = {}
+            ports.update(reg.module_ports(port_type, descriptor))
+            port_specs_cache[(descriptor, port_type)] = ports
+            return ports
 
     def get_input_port_spec(module, port_name):
         # Get current desc
@@ -270,31 +382,19 @@ def build_remap(module_name=None):
         port_specs = get_port_specs(new_desc, 'output')
         return port_name in port_specs and port_specs[port_name]
 
-    def build_function(old_function, new_function_name, new_module):
-        controller = _get_controller()
-        if len(old_function.parameters) > 0:
-            new_param_vals, aliases = \
-                zip(*[(p.strValue, p.alias)
-                      for p in old_function.parameters])
-        else:
-            new_param_vals = []
-            aliases = []
-        new_function = create_function(new_module,
-                                       new_function_name,
-                                       new_param_vals,
-                                       aliases)
-        return new_function
-
     def build_function_remap_method(desc, port_prefix, port_num):
-        f_map = {"vtkCellArray": {"InsertNextCell": 3}}
+        f_map = _f_map
+        # format the candidate names once here; remap runs per function
+        port_names = tuple("%s_%d" % (port_prefix, i)
+                           for i in xrange(1, port_num))
 
         def remap(old_function, new_module):
-            for i in xrange(1, port_num):
-                port_name = "%s_%d" % (port_prefix, i)
+            # depends only on old_function, not on the candidate port
+            old_sigstring = \
+                reg.expand_port_spec_string(old_function.sigstring,
+                                            basic_pkg)
+            for port_name in port_names:
                 port_spec = get_input_port_spec(new_module, port_name)
-                old_sigstring = \
-                    reg.expand_port_spec_string(old_function.sigstring,
-                                                basic_pkg)
                 if port_spec.sigstring == old_sigstring:
                     new_function = build_function(old_function, port_name,
                                                   new_module)
@@ -322,6 +422,10 @@ def build_remap(module_name=None):
             get_port_spec = get_output_port_spec
             idx = 0
 
+        # format the candidate names once here; remap runs per connection
+        port_names = tuple("%s_%d" % (port_prefix, i)
+                           for i in xrange(1, port_num))
+
         def remap(old_conn, new_module):
             create_new_connection = UpgradeWorkflowHandler.create_new_connection
             port = conn_lookup(old_conn)
@@ -330,8 +434,7 @@ def build_remap(module_name=None):
                        pipeline.modules[old_conn.destination.moduleId]]
             modules[idx] = new_module
             ports = [old_conn.source, old_conn.destination]
-            for i in xrange(1, port_num):
-                port_name = "%s_%d" % (port_prefix, i)
+            for port_name in port_names:
                 port_spec = get_port_spec(modules[idx], port_name)
                 if port_spec.sigstring == port.signature:
                     ports[idx] = port_name
@@ -359,16 +462,14 @@ def build_remap(module_name=None):
             remap_dict_key = 'src_port_remap'
         ports = get_port_specs(desc, port_type)
         port_nums = {}
-        for port_name, port_spec in ports.iteritems():
+        for port_name in ports:
             # FIXME just start at 1 and go until don't find port (no
             # need to track max)?
-            search_res = uscore_num.search(port_name)
-            if search_res:
-                port_prefix = search_res.group(1)
-                port_num = int(search_res.group(2))
-                if port_prefix not in port_nums:
-                    port_nums[port_prefix] = port_num
-                elif port_num > port_nums[port_prefix]:
+            i = port_name.rfind('_')
+            if i > 0 and port_name[i+1:].isdigit():
+                port_prefix = port_name[:i]
+                port_num = int(port_name[i+1:])
+                if port_num > port_nums.get(port_prefix, 0):
                     port_nums[port_prefix] = port_num
         for port_prefix, port_num in port_nums.iteritems():
             m = build_remap_method(desc, port_prefix, port_num, port_type)
@@ -379,80 +480,6 @@ def build_remap(module_name=None):
         if port_type == 'output' and desc.name in klasses:
             remap.add_remap('src_port_remap', 'self', 'Instance')
 
-    def change_func(name, value):
-        def remap(old_func, new_module):
-            controller = _get_controller()
-            new_function = create_function(new_module, name, [value])
-            return [('add', new_function, 'module', new_module.id)]
-        return remap
-
-    def change_SetXint(spec):
-        # Fix old SetX methods that takes an int representing the enum
-        def remap(old_func, new_module):
-            controller = _get_controller()
-            value = int(old_func.params[0].strValue)
-            value = spec.values[0][value]
-            new_function = create_function(new_module, spec.name, [value])
-            return [('add', new_function, 'module', new_module.id)]
-        return remap
-
-    def color_func(name):
-        def remap(old_func, new_module):
-            controller = _get_controller()
-            value = ','.join([p.strValue for p in old_func.params])
-            new_function = create_function(new_module, name, [value])
-            return [('add', new_function, 'module', new_module.id)]
-        return remap
-
-    def file_func(name):
-        def remap(old_func, new_module):
-            controller = _get_controller()
-            value = PathObject(old_func.params[0].strValue)
-            new_function = create_function(new_module, name, [value])
-            return [('add', new_function, 'module', new_module.id)]
-        return remap
-
-    def to_file_func(name):
-        # Add Path module as name->File converter
-        def remap(old_conn, new_module):
-            controller = _get_controller()
-            create_new_connection = UpgradeWorkflowHandler.create_new_connection
-            pipeline = _get_pipeline()
-            module = pipeline.modules[old_conn.source.moduleId]
-            x = (module.location.x + new_module.location.x)/2
-            y = (module.location.y + new_module.location.y)/2
-            path_module = controller.create_module(basic_pkg, 'Path',
-                                                   '', x, y)
-            conn1 = create_new_connection(controller,
-                                          module,
-                                          old_conn.source,
-                                          path_module,
-                                          'name')
-            # Avoid descriptor lookup by explicitly creating Ports
-            input_port_id = controller.id_scope.getNewId(Port.vtType)
-            input_port = Port(id=input_port_id,
-                              name='value',
-                              type='source',
-                              signature=(Path,),
-                              moduleId=path_module.id,
-                              moduleName=path_module.name)
-            output_port_id = controller.id_scope.getNewId(Port.vtType)
-            output_port = Port(id=output_port_id,
-                               name=name,
-                               type='destination',
-                               signature=(Path,),
-                               moduleId=new_module.id,
-                               moduleName=new_module.name)
-            conn2 = create_new_connection(controller,
-                                          path_module,
-                                          input_port,
-                                          new_module,
-                                          output_port)
-            return [('add', path_module),
-                    ('add', conn1),
-                    ('add', conn2)]
-        return remap
-
     def wrap_block_func():
         def remap(old_conn, new_module):
             controller = _get_controller()
@@ -511,9 +538,8 @@ def build_remap(module_name=None):
         return remap
 
     def process_module(desc):
+        # callers guarantee desc.name is in klasses
         # 0.9.3 upgrades
-        if not desc.name in klasses:
-            return
         remap = UpgradeModuleRemap(None, '0.9.3', '0.9.3',
                                    module_name=desc.name)
         process_ports(desc, remap, 'input')
@@ -535,110 +561,101 @@ def build_remap(module_name=None):
                 remap.new_module = old
                 _remap.add_module_remap(remap, old)
         # 1.0.0 upgrades
-        input_mappings = {}
-        function_mappings = {}
+        # add remaps directly instead of staging them in intermediate
+        # dicts that are copied into the remap afterwards
+        remap = UpgradeModuleRemap('0.9.5', '1.0.0', '1.0.0',
+                                   module_name=desc.name)
+        add_input = lambda k, v: remap.add_remap('dst_port_remap', k, v)
+        add_output = lambda k, v: remap.add_remap('src_port_remap', k, v)
+        add_function = lambda k, v: remap.add_remap('function_remap', k, v)
         input_specs = [desc.module._get_input_spec(s)
                      for s in get_port_specs(desc, 'input')]
-        input_names = [s.name for s in input_specs]
         for spec in input_specs:
             if spec is None:
                 continue
             elif spec.name == 'TextScaleMode':
-                function_mappings['ScaledTextOn'] = \
-                                           change_func('TextScaleMode', 'Prop')
+                add_function('ScaledTextOn',
+                             change_func('TextScaleMode', 'Prop'))
             elif spec.method_type == 'OnOff':
                 # Convert On/Off to single port
-                input_mappings[spec.name + 'On'] = spec.name
-                input_mappings[spec.name + 'Off'] = spec.name
-                function_mappings[spec.name + 'On'] = \
-                                              change_func(spec.name, True)
-                function_mappings[spec.name + 'Off'] = \
-                                             change_func(spec.name, False)
+                add_input(spec.name + 'On', spec.name)
+                add_input(spec.name + 'Off', spec.name)
+                add_function(spec.name + 'On', change_func(spec.name, True))
+                add_function(spec.name + 'Off', change_func(spec.name, False))
             elif spec.method_type == 'nullary':
                 # Add True to execute empty functions
-                function_mappings[spec.name] = change_func(spec.name, True)
+                add_function(spec.name, change_func(spec.name, True))
             elif spec.method_type == 'SetXToY':
                 # Add one mapping for each default
                 for enum in spec.values[0]:
-                    input_mappings[spec.method_name + enum] = spec.name
+                    add_input(spec.method_name + enum, spec.name)
                     # Add enum value to function
-                    function_mappings[spec.method_name + enum] = \
-                                                  change_func(spec.name, enum)
+                    add_function(spec.method_name + enum,
+                                 change_func(spec.name, enum))
                 # Convert SetX(int) methods
-                old_name = spec.method_name[:-2]
-                function_mappings[spec.method_name[:-2]] = change_SetXint(spec)
+                add_function(spec.method_name[:-2], change_SetXint(spec))
             elif spec.port_type == 'basic:Color':
                 # Remove 'Widget' suffix on Color
-                input_mappings[spec.method_name + 'Widget'] = spec.name
+                add_input(spec.method_name + 'Widget', spec.name)
                 # Remove 'Set prefix'
-                input_mappings[spec.method_name] = spec.name
+                add_input(spec.method_name, spec.name)
                 # Change old type (float, float, float) -> (,)*3
-                function_mappings[spec.method_name] = color_func(spec.name)
+                add_function(spec.method_name, color_func(spec.name))
             elif spec.port_type == 'basic:File':
-                input_mappings[spec.method_name] = to_file_func(spec.name)  # Set*FileName -> (->File->*File)
-                input_mappings['Set' + spec.name] = spec.name # Set*File -> *File
-                function_mappings[spec.method_name] = file_func(spec.name)
+                add_input(spec.method_name, to_file_func(spec.name))  # Set*FileName -> (->File->*File)
+                add_input('Set' + spec.name, spec.name) # Set*File -> *File
+                add_function(spec.method_name, file_func(spec.name))
             elif base_name(spec.name) == 'AddDataSetInput':
                 # SetInput* does not exist in VTK 6
                 if spec.name[15:] == '_1':
                     # Upgrade from version without overload
-                    input_mappings['AddInput'] = spec.name
-                input_mappings['AddInput' + spec.name[15:]] = spec.name
+                    add_input('AddInput', spec.name)
+                add_input('AddInput' + spec.name[15:], spec.name)
             elif base_name(spec.name) == 'InputData':
                 # SetInput* does not exist in VTK 6
                 if spec.name[9:] == '_1':
                     # Upgrade from version without overload
-                    input_mappings['SetInput'] = spec.name
-                input_mappings['SetInput' + spec.name[9:]] = spec.name
+                    add_input('SetInput', spec.name)
+                add_input('SetInput' + spec.name[9:], spec.name)
             elif base_name(spec.name) == 'AddInputData':
                 # AddInput* does not exist in VTK 6
                 if spec.name[12:] == '_1':
                     # Upgrade from version without overload
-                    input_mappings['AddInput'] = spec.name
-                input_mappings['AddInput' + spec.name[12:]] = spec.name
+                    add_input('AddInput', spec.name)
+                add_input('AddInput' + spec.name[12:], spec.name)
             elif base_name(spec.name) ==  'SourceData':
                 # SetSource* does not exist in VTK 6
                 if spec.name[10:] == '_1':
                     # Upgrade from version without overload
-                    input_mappings['SetSource'] = spec.name
-                input_mappings['SetSource' + spec.name[10:]] = spec.name
+                    add_input('SetSource', spec.name)
+                add_input('SetSource' + spec.name[10:], spec.name)
             elif spec.method_name == 'Set' + base_name(spec.name):
                 if spec.name[-2:] == '_1':
                     # Upgrade from versions without overload
-                    input_mappings[spec.name[:-2]] = spec.name
-                    input_mappings['Set' + spec.name[:-2]] = spec.name
+                    add_input(spec.name[:-2], spec.name)
+                    add_input('Set' + spec.name[:-2], spec.name)
                 # Remove 'Set' prefixes
-                input_mappings['Set' + spec.name] = spec.name
+                add_input('Set' + spec.name, spec.name)
             elif spec.name == 'AddInput_1':
                 # FIXME what causes this?
                 # New version does not have AddInput
-                input_mappings['AddInput'] = 'AddInput_1'
+                add_input('AddInput', 'AddInput_1')
             elif spec.name == 'vtkRenderer':
                 # Classes having SetRendererWindow also used to have VTKCell
-                input_mappings['SetVTKCell'] = fix_vtkcell_func()
-        output_mappings = {}
+                add_input('SetVTKCell', fix_vtkcell_func())
         for spec_name in get_port_specs(desc, 'output'):
             spec = desc.module._get_output_spec(spec_name)
             if spec is None:
                 continue
             if spec.method_name == 'Get' + spec.name:
                 # Remove 'Get' prefixes
-                output_mappings[spec.method_name] = spec.name
+                add_output(spec.method_name, spec.name)
         if desc.name == 'vtkMultiBlockPLOT3DReader':
             # Move GetOutput to custom FirstBlock
-            output_mappings['GetOutput'] = wrap_block_func()  # what!?
+            add_output('GetOutput', wrap_block_func())  # what!?
             # Move GetOutputPort0 to custom FirstBlock
             # and change destination port to AddInputData_1 or similar
-            output_mappings['GetOutputPort0'] = wrap_block_func()
-
-        remap = UpgradeModuleRemap('0.9.5', '1.0.0', '1.0.0',
-                                   module_name=desc.name)
-        for k, v in input_mappings.iteritems():
-            remap.add_remap('dst_port_remap', k, v)
-        for k, v in output_mappings.iteritems():
-            remap.add_remap('src_port_remap', k, v)
-        for k, v in function_mappings.iteritems():
-            remap.add_remap('function_remap', k, v)
+            add_output('GetOutputPort0', wrap_block_func())
         _remap.add_module_remap(remap)
         for old, new in module_name_remap.iteritems():
             if desc.name == new:
@@ -649,16 +666,38 @@ def build_remap(module_name=None):
     pkg = reg.get_package_by_name(identifier)
     if module_name is not None:
         desc = reg.get_descriptor_by_name(identifier, module_name)
-        process_module(desc)
+        if desc.name in klasses:
+            process_module(desc)
     else:
         # FIXME do this by descriptor first, then build the hierarchies for each
         # module after that...
         for desc in pkg.descriptor_list:
+            if desc.name not in klasses:
+                # not a generated VTK class, nothing to remap
+                continue
+            if _remap.has_module_remaps(desc.name):
+                # already built by a per-module request
+                continue
             process_module(desc)
 
+# guards _remap against the prebuild thread; reentrant in case remapping
+# triggers a nested upgrade request on the gui thread
+_remap_lock = threading.RLock()
+
+def _prebuild_remap():
+    # fill in the remaining modules so later upgrade requests find their
+    # remaps ready instead of each paying a build_remap call
+    with _remap_lock:
+        build_remap()
+
 def handle_module_upgrade_request(controller, module_id, pipeline):
+    with _remap_lock:
+        return _handle_module_upgrade_request(controller, module_id, pipeline)
+
+def _handle_module_upgrade_request(controller, module_id, pipeline):
     global _remap, _controller, _pipeline
 
+    prebuild = False
     if _remap is None:
         _remap = UpgradePackageRemap()
         remap = UpgradeModuleRemap(None, '1.0.0', '1.0.0',
@@ -672,6 +711,7 @@ def handle_module_upgrade_request(controller, module_id, pipeline):
                                    module_name='VTKViewCell',
                                    new_module='VTKCell')
         _remap.add_module_remap(remap)
+        prebuild = True
 
     _controller = controller
     _pipeline = pipeline
@@ -679,6 +719,12 @@ def handle_module_upgrade_request(controller, module_id, pipeline):
     module_name = module_name_remap.get(module_name, module_name)
     if not _remap.has_module_remaps(module_name):
         build_remap(module_name)
+    if prebuild:
+        # first upgrade request: build the rest of the package map in the
+        # background while this request proceeds
+        prebuild_thread = threading.Thread(target=_prebuild_remap)
+        prebuild_thread.daemon = True
+        prebuild_thread.start()
 
     try:
         from vistrails.packages.spreadsheet.init import upgrade_cell_to_output
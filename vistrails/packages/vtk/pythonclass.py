@@ -53,6 +53,15 @@ class BaseClassModule(Module):
     _get_input_spec = classmethod(get_input_spec)
     _get_output_spec = classmethod(get_output_spec)
 
+    # spec-derived constants; gen_class_module bakes the real values into
+    # each generated class so compute() does not walk the spec object
+    _lib_class = None
+    _spec_callback = None
+    _spec_tempfile = None
+    _spec_compute = None
+    _spec_cleanup = None
+    _methods_last = False
+
     def call_set_method(self, instance, port, params):
         # convert params
         params = convert_input(params, self.input_specs[port.name].signature)
@@ -78,24 +87,25 @@ class BaseClassModule(Module):
         prepend_params = port.get_prepend_params()
         # print "SETTING", method_name, prepend_params + params, instance.vtkInstance.__class__.__name__
         method = getattr(instance, method_name)
-        try:
+        if prepend_params:
             method(*(prepend_params + params))
-        except Exception, e:
-            raise
+        else:
+            # skip the list concatenation; most ports prepend nothing
+            method(*params)
 
     def call_get_method(self, instance, port):
         # print "GETTING", port.method_name, port.get_prepend_params(), instance.vtkInstance.__class__.__name__
         method = getattr(instance, port.method_name)
-        try:
-            value = method(*(port.get_prepend_params()))
-            # convert params
-            return convert_output(value, self.output_specs[port.name].signature)
-        except Exception, e:
-            raise
+        value = method(*(port.get_prepend_params()))
+        # convert params
+        return convert_output(value, self.output_specs[port.name].signature)
 
     def call_inputs(self, instance):
         # compute input methods and connections
         # We need to preserve the order of the inputs
+        # the spec lookup walks the mro, so resolve each port once while
+        # building the call list instead of again per call below
+        get_spec = self._get_input_spec
         methods = self.is_method.values()
         methods.sort()
         methods_to_call = []
@@ -103,15 +113,17 @@ class BaseClassModule(Module):
             (_, port) = value
             conn = self.is_method.inverse[value]
             p = conn()
+            spec = get_spec(port)
             # Convert to correct port depth
             depth = conn.depth()
-            while depth < self._get_input_spec(port).depth:
+            while depth < spec.depth:
                 p = [p]
                 depth += 1
-            methods_to_call.append([port, p])
+            methods_to_call.append([spec, p])
         connections_to_call = []
         for (function, connector_list) in self.inputPorts.iteritems():
             param_list = self.force_get_input_list(function)
+            spec = get_spec(function)
             for p, connector in izip(param_list, connector_list):
                 # Don't call method
                 if connector in self.is_method:
@@ -120,17 +132,16 @@ class BaseClassModule(Module):
                 while depth < connector.spec.depth:
                     p = [p]
                     depth += 1
-                connections_to_call.append([function, p])
+                connections_to_call.append([spec, p])
         # Compute methods from visible ports last
         # In the case of a vtkRenderer,
         # we need to call the methods after the
         # input ports are set.
-        if self._module_spec.methods_last:
+        if self._methods_last:
             to_call = connections_to_call + methods_to_call
         else:
             to_call = methods_to_call + connections_to_call
-        for port_name, params in to_call:
-            port = self._get_input_spec(port_name)
+        for port, params in to_call:
             # Call method once for each item in depth1 lists
             if port.depth == 0:
                 params = [params]
@@ -138,12 +149,10 @@ class BaseClassModule(Module):
                 self.call_set_method(instance, port, ps)
 
     def call_outputs(self, instance):
-        outputs_list = self.output_specs_order[:]
-        if 'self' in outputs_list:
-            outputs_list.remove('self')
-        if 'Instance' in outputs_list:
-            outputs_list.remove('Instance')
-        for port_name in outputs_list:
+        for port_name in self.output_specs_order:
+            if port_name == 'self' or port_name == 'Instance':
+                # self is set by the base Module, Instance by compute()
+                continue
             if port_name not in self.outputPorts:
                 # not connected
                 continue
@@ -152,31 +161,31 @@ class BaseClassModule(Module):
             self.set_output(port_name, result)
 
     def compute(self):
-        spec = self._module_spec
         # First create the instance
         # TODO: How to handle parameters to instance
-        instance = getattr(self._lib, spec.code_ref)()
+        klass = self._lib_class
+        if klass is None:
+            # code_ref did not resolve at generation time; fail here with
+            # the same AttributeError the lazy lookup used to give
+            klass = getattr(self._lib, self._module_spec.code_ref)
+        instance = klass()
 
         # Optional callback used for progress reporting
-        if spec.callback:
+        if self._spec_callback:
             def callback(c):
                 self.logging.update_progress(self, c)
-            getattr(instance, spec.callback)(callback)
+            getattr(instance, self._spec_callback)(callback)
         # Optional function for creating temporary files
-        if spec.tempfile:
-            getattr(instance, spec.tempfile)(self.interpreter.filePool.create_file)
+        if self._spec_tempfile:
+            getattr(instance, self._spec_tempfile)(
+                    self.interpreter.filePool.create_file)
 
         # call input methods on instance
         self.call_inputs(instance)
 
         # optional compute method
-        if spec.compute:
-            getattr(instance, spec.compute)()
-
-        # convert outputs to dict
-        outputs = {}
-        outputs_list = self.output_specs_order[:]
-        outputs_list.remove('self')  # self is automatically set by base Module
+        if self._spec_compute:
+            getattr(instance, self._spec_compute)()
 
         # Get outputs
         self.call_outputs(instance)
@@ -184,8 +193,13 @@ class BaseClassModule(Module):
         self.set_output('Instance', instance)
 
         # optional cleanup method
-        if spec.cleanup:
-            getattr(instance, spec.cleanup)()
+        if self._spec_cleanup:
+            getattr(instance, self._spec_cleanup)()
+
+
+# classes already generated, keyed on the spec object; the class pins the
+# spec through _module_spec so the id cannot be recycled while cached
+_class_cache = {}
 
 
 def gen_class_module(spec, lib, klasses, **module_settings):
@@ -196,6 +210,11 @@ def gen_class_module(spec, lib, klasses, **module_settings):
     spec : ClassSpec
         A class to module specification
     """
+    cached = _class_cache.get((id(spec), spec.module_name))
+    if cached is not None:
+        klasses[spec.module_name] = cached
+        return cached
+
     module_settings.update(spec.get_module_settings())
     _settings = ModuleSettings(**module_settings)
 
@@ -223,9 +242,17 @@ def gen_class_module(spec, lib, klasses, **module_settings):
          '_output_spec_table': _output_spec_table,
          '_module_spec': spec,
          'is_cacheable': lambda self: spec.cacheable,
-         '_lib': lib}
+         '_lib': lib,
+         # resolved once here instead of on every compute
+         '_lib_class': getattr(lib, spec.code_ref, None),
+         '_spec_callback': spec.callback,
+         '_spec_tempfile': spec.tempfile,
+         '_spec_compute': spec.compute,
+         '_spec_cleanup': spec.cleanup,
+         '_methods_last': spec.methods_last}
 
     superklass = klasses.get(spec.superklass, BaseClassModule)
     new_klass = type(str(spec.module_name), (superklass,), d)
     klasses[spec.module_name] = new_klass
+    _class_cache[(id(spec), spec.module_name)] = new_klass
     return new_klass
@@ -79,10 +79,12 @@ class SpecList(object):
         if klass is None:
             klass = ModuleSpec
         module_specs = []
-        tree = ET.parse(fname)
-        for elt in tree.getroot():
+        # stream the file instead of materializing the whole tree; the
+        # spec files run to several MB of elements
+        for _, elt in ET.iterparse(fname):
             if elt.tag == klass.xml_name:
                 module_specs.append(klass.from_xml(elt))
+                elt.clear()
         retval = SpecList(module_specs)
         # for spec in retval.module_specs:
         #     print "==", spec.name, "=="
@@ -43,6 +43,11 @@ import os
 import tempfile
 import types
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 from  platform import system
 
 import vtk
@@ -312,7 +317,23 @@ def initialize(spec_name=None):
         spec_name = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'vtk.xml')
         if not os.path.exists(spec_name):
             return
-    specs = SpecList.read_from_xml(spec_name, ClassSpec)
+    # a pickle sidecar skips re-parsing the multi-MB XML on warm startup;
+    # any problem with it just falls back to the XML
+    pkl_name = spec_name + '.pkl'
+    specs = None
+    try:
+        if os.path.getmtime(pkl_name) >= os.path.getmtime(spec_name):
+            with open(pkl_name, 'rb') as f:
+                specs = pickle.load(f)
+    except Exception:
+        specs = None
+    if specs is None:
+        specs = SpecList.read_from_xml(spec_name, ClassSpec)
+        try:
+            with open(pkl_name, 'wb') as f:
+                pickle.dump(specs, f, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            pass
     for spec in specs.module_specs:
         globals()[spec.module_name] = gen_instance_factory(spec)
 